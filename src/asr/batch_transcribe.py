@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import model_loader
+
+# 批量转写一个目录（或清单）里的音视频文件
+#
+#   python src/asr/batch_transcribe.py audio/backlog --workers 4 --out results.jsonl
+#   python src/asr/batch_transcribe.py --manifest list.txt --script sense_voice
+#
+# 文件分给若干工作进程，每个进程只加载一次模型（file_paraforme.py 或 file_sense_voice.py 里的配置），
+# 每个进程分到 CPU 核数 / 进程数 个推理线程，避免多个进程抢核。
+# 结果逐行追加写到 jsonl，程序中途退出后重新运行同一条命令，已经成功的文件会跳过。
+
+support_audio_format = ['.mp3', '.m4a', '.aac', '.ogg', '.wav', '.flac', '.wma', '.aif']
+support_video_format = ['.mp4', '.avi', '.mov', '.mkv']
+scripts = {'paraformer': 'file_paraforme', 'sense_voice': 'file_sense_voice'}
+
+# 工作进程里的模型和识别脚本
+worker = {}
+
+
+def find_files(directory):
+    formats = set(support_audio_format + support_video_format)
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in formats:
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+
+def read_manifest(path):
+    # 每行一个路径，或者 jsonl，每行带 path 或 audio 字段
+    files = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                item = json.loads(line)
+                line = item.get('path') or item.get('audio')
+            files.append(line)
+    return files
+
+
+def read_done(path):
+    """已经成功转写的文件，损坏的行（上次写到一半退出）忽略"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if result.get('status') == 'ok':
+                done.add(result['path'])
+    return done
+
+
+def init_worker(script, backend, device, threads):
+    # 线程数要在导入 torch 之前设置才生效（torch 在 load_model 里才导入）
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    module = importlib.import_module(scripts[script])
+    worker['module'] = module
+    worker['model'] = module.load_model(backend=backend, device=device, ncpu=threads)
+
+
+def transcribe(path):
+    start = time.perf_counter()
+    result = {'path': path, 'pid': os.getpid()}
+    try:
+        text, duration = worker['module'].transcribe(worker['model'], path)
+        result.update(status='ok', text=text, duration=round(duration, 2))
+    except Exception as e:
+        result.update(status='error', error=repr(e))
+    result['elapsed'] = round(time.perf_counter() - start, 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程批量转写音视频文件')
+    parser.add_argument('directory', nargs='?', help='要转写的目录，递归查找音视频文件')
+    parser.add_argument('--manifest', help='文件清单：每行一个路径，或 jsonl（path / audio 字段）')
+    parser.add_argument('--out', default='transcripts.jsonl', help='结果 jsonl，重新运行时跳过已成功的文件')
+    parser.add_argument('--script', default='paraformer', choices=list(scripts))
+    parser.add_argument('--workers', type=int, default=2, help='工作进程数')
+    parser.add_argument('--threads', type=int, help='每个进程的推理线程数，默认 CPU 核数 / 进程数')
+    parser.add_argument('--backend', default='torch', choices=model_loader.backends)
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+    if not args.directory and not args.manifest:
+        parser.error('需要指定目录或 --manifest')
+
+    files = read_manifest(args.manifest) if args.manifest else find_files(args.directory)
+    done = read_done(args.out)
+    todo = [path for path in files if path not in done]
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    print(f'共 {len(files)} 个文件，已完成 {len(files) - len(todo)} 个，'
+          f'{args.workers} 个进程，每个 {threads} 个线程')
+    if not todo:
+        return
+
+    audio_seconds = 0.0
+    failed = 0
+    start = time.perf_counter()
+    ctx = mp.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx, initializer=init_worker,
+                             initargs=(args.script, args.backend, args.device, threads)) as pool, \
+            open(args.out, 'a', encoding='utf-8') as out:
+        futures = [pool.submit(transcribe, path) for path in todo]
+        for i, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            # 只有主进程写文件，每行写完立即落盘
+            out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            out.flush()
+            if result['status'] == 'ok':
+                audio_seconds += result['duration']
+                print(f'[{i}/{len(todo)}] {result["path"]}  {result["duration"]:.1f}s 音频，用时 {result["elapsed"]:.1f}s')
+            else:
+                failed += 1
+                print(f'[{i}/{len(todo)}] {result["path"]}  出错：{result["error"]}')
+
+    wall = time.perf_counter() - start
+    print(f'\n完成 {len(todo) - failed} 个，失败 {failed} 个，音频 {audio_seconds / 3600:.2f} 小时，'
+          f'用时 {wall / 3600:.2f} 小时，吞吐 {audio_seconds / wall:.1f} 音频小时/小时')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import model_loader
+from utils.decoder import decode
+
+# 比较各推理后端（torch、onnx、onnx-int8）在同一段音频上的实时率（RTF）和内存
+# 每个后端在单独的子进程里加载、测试，峰值内存互不影响
+#
+#   python src/asr/bench_backends.py --audio audio/zh.mp3 --threads 4
+#
+# RTF = 推理耗时 / 音频时长，越小越快；小于 1 才能实时
+
+home_directory = os.path.expanduser("D:/Cache/model/asr")
+asr_model_path = os.path.join(home_directory,"iic/speech_seaco_paraformer_large_asr_nat-zh-cn-16k-common-vocab8404-pytorch")
+vad_model_path = os.path.join(home_directory,"iic/speech_fsmn_vad_zh-cn-16k-common-pytorch")
+punc_model_path = os.path.join(home_directory,"iic/punc_ct-transformer_zh-cn-common-vocab272727-pytorch")
+
+chunk_size = [10, 20, 10]  # 左回看，片段，右回看，单位 60ms
+
+
+def run_backend(backend, args, speech, result_queue):
+    try:
+        model, timings = model_loader.load_model(backend=backend,
+                                                 model=args.model,
+                                                 vad_model=args.vad_model or None,
+                                                 punc_model=args.punc_model or None,
+                                                 ncpu=args.threads,
+                                                 device=args.device,
+                                                 disable_pbar=True,
+                                                 disable_log=True,
+                                                 disable_update=True)
+        duration = len(speech) / 16000
+        result = {'backend': backend, **{k: round(v, 3) for k, v in timings.items()}}
+
+        # 整段识别
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            rec_result = model.generate(input=speech, cache={}, is_final=True)
+            times.append(time.perf_counter() - start)
+        result['offline_rtf'] = round(min(times) / duration, 4)
+        result['text'] = rec_result[0]['text'] if rec_result else ''
+
+        # 按 chunk_size[1] 个片段一块，流式识别
+        step = chunk_size[1] * 960
+        cache = {}
+        start = time.perf_counter()
+        for offset in range(0, len(speech), step):
+            model.generate(input=speech[offset:offset + step], cache=cache,
+                           is_final=offset + step >= len(speech))
+        result['chunked_rtf'] = round((time.perf_counter() - start) / duration, 4)
+
+        result['peak_rss_mb'] = model_loader.peak_rss_mb()
+    except Exception as e:
+        result = {'backend': backend, 'error': repr(e)}
+    result_queue.put(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较各推理后端的实时率和内存')
+    parser.add_argument('--audio', default='audio/zh.mp3')
+    parser.add_argument('--backends', nargs='+', default=list(model_loader.backends), choices=model_loader.backends)
+    parser.add_argument('--threads', type=int, default=4, help='CPU 推理线程数')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--repeat', type=int, default=3, help='整段识别重复次数，取最快的一次')
+    parser.add_argument('--model', default=asr_model_path)
+    parser.add_argument('--vad-model', default=vad_model_path)
+    parser.add_argument('--punc-model', default=punc_model_path)
+    parser.add_argument('--json', help='结果另存为 json')
+    args = parser.parse_args()
+
+    speech = decode(args.audio)
+    print(f'{args.audio}：{len(speech) / 16000:.1f}s，线程数 {args.threads}\n')
+
+    ctx = mp.get_context('spawn')
+    results = []
+    for backend in args.backends:
+        result_queue = ctx.Queue()
+        process = ctx.Process(target=run_backend, args=(backend, args, speech, result_queue))
+        process.start()
+        result = result_queue.get()
+        process.join()
+        results.append(result)
+        if 'error' in result:
+            print(f'{backend:<10} 出错：{result["error"]}')
+        else:
+            print(f'{backend:<10} 加载 {result["load"]:>6.2f}s  首次推理 {result["warmup"]:>6.2f}s  '
+                  f'整段 RTF {result["offline_rtf"]:.4f}  分块 RTF {result["chunked_rtf"]:.4f}  '
+                  f'峰值内存 {result["peak_rss_mb"]} MB')
+            print(f'{"":<10} {result["text"][:60]}')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import argparse
+import inspect
+import importlib
+from functools import partial
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import stub_model
+from utils.decoder import decode
+from utils.replay import session
+
+# 流式识别的延迟、实时率压测，不需要麦克风
+#
+# 用 audio/ 下的录音按实时（或加速）节奏喂给 recognize()，统计：
+#   - preview / final：虚文字、实文字发出时，距离最新一个片段写入过了多久
+#   - first_preview：一段语音开始后，多久出现第一个虚文字
+#   - rtf：推理总耗时 / 音频时长；cpu：识别进程的 CPU 时间 / 音频时长
+#
+#   python src/asr/bench_streaming.py --audio audio/zh.mp3 --json bench.json
+#   python src/asr/bench_streaming.py --stub --delay 30 --speed 0 --max final_p95=500 --max cpu=0.2
+#
+# --stub 用 utils/stub_model.py 的假模型，每次推理固定耗时，只测管线本身的开销，CI 上也能跑。
+# --max 名称=上限 设置回归阈值（毫秒或比例），超过时退出码为 1
+
+scripts = {'paraformer': 'streaming_paraformer', 'sense_voice': 'streaming_sense_voice'}
+frame_seconds = 0.06
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values) * 1000
+    result = {'n': len(values), 'mean': values.mean()}
+    for q in (50, 90, 95, 99):
+        result[f'p{q}'] = np.percentile(values, q)
+    result['max'] = values.max()
+    return {k: v if k == 'n' else round(float(v), 1) for k, v in result.items()}
+
+
+def latencies(events, writes):
+    """各事件距离写入的秒数，第 k 个收到的片段就是第 k 次写入"""
+    latency = {'preview': [], 'final': [], 'first_preview': []}
+    seen = set()
+    for event in events:
+        if event['type'] not in ('preview', 'final') or not 0 < event['frame'] <= len(writes):
+            continue
+        latency[event['type']].append(event['time'] - writes[event['frame'] - 1])
+        if event['type'] == 'preview' and event['segment'] not in seen and event['onset']:
+            seen.add(event['segment'])
+            latency['first_preview'].append(event['time'] - writes[event['onset'] - 1])
+    return latency
+
+
+def run_file(module, path, args, load):
+    speech = decode(path)
+    writes, events, dropped = session(module.recognize, speech, args.speed, load=load,
+                                      chunk_size=args.chunk_size, pre_expect=args.pre_expect)
+    stats = events.pop()
+    latency = latencies(events, writes)
+
+    duration = len(writes) * frame_seconds
+    return {'path': path, 'duration': round(duration, 2), 'dropped': dropped,
+            'rtf': round(stats['scheduler']['busy_s'] / duration, 4),
+            'cpu': round(stats['cpu'] / duration, 4),
+            'text': ''.join(e['text'] for e in events if e['type'] == 'final'),
+            'scheduler': stats['scheduler'], 'vad': stats['vad'],
+            'latency': {k: percentiles(v) for k, v in latency.items()},
+            'raw': latency}
+
+
+def summarize(results):
+    duration = sum(r['duration'] for r in results)
+    summary = {'files': len(results), 'duration': round(duration, 2),
+               'dropped': sum(r['dropped'] for r in results),
+               'rtf': round(sum(r['rtf'] * r['duration'] for r in results) / duration, 4),
+               'cpu': round(sum(r['cpu'] * r['duration'] for r in results) / duration, 4)}
+    for kind in ('preview', 'final', 'first_preview'):
+        stats = percentiles([v for r in results for v in r['raw'][kind]])
+        for k, v in (stats or {}).items():
+            if k != 'n':
+                summary[f'{kind}_{k}'] = v
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流式识别延迟、实时率压测')
+    parser.add_argument('--audio', nargs='+', default=['audio/zh.mp3'])
+    parser.add_argument('--script', default='paraformer', choices=list(scripts))
+    parser.add_argument('--speed', type=float, default=1.0, help='喂音频的倍速，0 为不限速')
+    parser.add_argument('--chunk-size', type=int, nargs=3, help='默认用脚本里的 chunk_size')
+    parser.add_argument('--pre-expect', type=int, help='初始预测间隔，默认用脚本里的值')
+    parser.add_argument('--stub', action='store_true', help='用假模型，只测管线开销')
+    parser.add_argument('--delay', type=float, default=20, help='假模型每次推理的耗时（毫秒）')
+    parser.add_argument('--stub-rtf', type=float, default=0.0, help='假模型每秒音频额外的推理耗时（秒）')
+    parser.add_argument('--max', action='append', default=[], metavar='名称=上限',
+                        help='回归阈值，例如 final_p95=800、cpu=0.3，可以多次指定')
+    parser.add_argument('--json', help='结果另存为 json')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    module = importlib.import_module(scripts[args.script])
+    defaults = inspect.signature(module.recognize).parameters
+    args.chunk_size = args.chunk_size or list(defaults['chunk_size'].default)
+    args.pre_expect = args.pre_expect or defaults['pre_expect'].default
+    load = partial(stub_model.load_model, delay=args.delay / 1000, rtf=args.stub_rtf) if args.stub else module.load_model
+
+    results = []
+    for path in args.audio:
+        result = run_file(module, path, args, load)
+        results.append(result)
+        lat = result['latency']
+        print(f'{path}：{result["duration"]:.1f}s，RTF {result["rtf"]:.3f}，CPU {result["cpu"]:.3f}，丢弃 {result["dropped"]} 片段')
+        for kind in ('preview', 'final', 'first_preview'):
+            if lat[kind]:
+                print(f'  {kind:<14} p50 {lat[kind]["p50"]:>7.1f}ms  p95 {lat[kind]["p95"]:>7.1f}ms  '
+                      f'max {lat[kind]["max"]:>7.1f}ms  ({lat[kind]["n"]} 次)')
+
+    summary = summarize(results)
+    failures = []
+    for item in args.max:
+        name, limit = item.split('=')
+        if name not in summary:
+            failures.append(f'{name}：没有这项指标')
+        elif summary[name] > float(limit):
+            failures.append(f'{name} = {summary[name]}，超过上限 {limit}')
+
+    if args.json:
+        for result in results:
+            del result['raw']
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'summary': summary, 'files': results, 'failures': failures},
+                      f, ensure_ascii=False, indent=2)
+    for failure in failures:
+        print(f'\033[31m{failure}\033[0m')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import time
+import base64
+import struct
+import asyncio
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.caption_protocol import CaptionLines, decode
+
+# 字幕广播
+# 识别进程只往一个 UDP 端口发字幕，这里收一次，再分发给任意多个订阅者：
+#   - WebSocket   ws://host:8000/asr，消息格式和 live_transcription.html 一致（lines + buffer_transcription）
+#   - SSE         http://host:8000/events，每条 data 是同样的 json
+#   - UDP         --udp 127.0.0.1:6011，原样转发识别进程的数据报，悬浮字幕改个端口就能接
+#   - 网页        http://host:8000/?watch 打开 live_transcription.html，只看字幕、不录音
+#
+# 全部在一个事件循环里，不阻塞识别进程：
+#   - 字幕变化后最多每 flush_interval 秒广播一次，json 和 WebSocket/SSE 帧只编码一次，所有客户端共用
+#   - 每个客户端一个有界发送队列，队列满时丢掉还没发出去的旧快照，只留最新的（每条都是完整快照，丢了不影响显示）
+#   - 客户端超过 stall_timeout 秒还收不下数据（网络断了、页面挂起），直接断开
+#
+#   python src/asr/caption_broadcaster.py --udp 127.0.0.1:6011
+#   python src/asr/caption_broadcaster.py --listen 6009 --port 8000
+
+# 从哪个端口接收识别进程的字幕（识别脚本里的 udp_port）
+udp_port = 6009
+
+# WebSocket / SSE / 网页共用的 HTTP 端口
+http_port = 8000
+
+# 每个客户端的发送队列长度
+queue_size = 4
+
+# 客户端多久收不下数据就断开（秒）
+stall_timeout = 10
+
+# 每个客户端的发送缓冲（还没写进内核的部分）最多积压多少字节，超过后新快照进队列，由 pump 等着发
+write_buffer = 64 * 1024
+
+# 两次广播的最小间隔（秒），期间的多次变化合并成一次
+flush_interval = 0.05
+
+# 快照里保留最近多少行已完成的字幕
+history = 20
+
+page_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'meeting_helper', 'live_transcription.html')
+
+ws_guid = b'258EAFA5-E914-47DA-95CA-C5AB0DC11B85'
+
+
+def ws_frame(payload, opcode=0x1):
+    """服务端发往浏览器的帧，不加掩码"""
+    n = len(payload)
+    if n < 126:
+        head = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 65536:
+        head = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return head + payload
+
+
+class Captions(CaptionLines):
+    """当前字幕，转成 live_transcription.html 的消息格式"""
+
+    def __init__(self):
+        super().__init__(history)
+
+    def snapshot(self):
+        current, partial = self.current
+        lines = [{'speaker': -1, 'text': text} for text in self.lines]
+        lines.append({'speaker': -1, 'text': current})
+        return {'type': 'transcription', 'lines': lines, 'buffer_transcription': partial,
+                'buffer_diarization': '', 'remaining_time_transcription': 0,
+                'remaining_time_diarization': 0, 'status': 'active_transcription'}
+
+
+class Subscriber:
+    """一个 WebSocket 或 SSE 客户端"""
+
+    def __init__(self, kind, writer):
+        self.kind = kind
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.coalesced = 0
+
+    def offer(self, payload):
+        transport = self.writer.transport
+        if self.queue.empty() and transport.get_write_buffer_size() < write_buffer:
+            # 发送缓冲没有积压时直接写，省掉一次唤醒 pump 任务
+            transport.write(payload)
+            return
+        if self.queue.full():
+            # 还没发出去的都是旧快照，丢掉，只留最新的
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.coalesced += 1
+        self.queue.put_nowait(payload)
+
+    async def pump(self):
+        """把队列里的数据写给客户端，超时收不下就放弃"""
+        while (payload := await self.queue.get()) is not None:
+            self.writer.write(payload)
+            await asyncio.wait_for(self.writer.drain(), stall_timeout)
+
+
+class Broadcaster(asyncio.DatagramProtocol):
+
+    def __init__(self, udp_targets=()):
+        self.captions = Captions()
+        self.subscribers = set()
+        self.udp_targets = list(udp_targets)
+        self.transport = None
+        self.flush_handle = None
+        self.last_flush = 0.0
+        self.frames = {}      # 当前快照编码好的 {'ws': ..., 'sse': ...}
+        self.stats = {'datagrams': 0, 'broadcasts': 0, 'dropped': 0, 'connected': 0, 'coalesced': 0}
+
+    # ---- 接收识别进程的字幕 ----
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.stats['datagrams'] += 1
+        for target in self.udp_targets:
+            self.transport.sendto(data, target)
+        try:
+            message = decode(data)
+        except (UnicodeDecodeError, struct.error):
+            return
+        if self.captions.apply(message):
+            self.schedule_flush()
+
+    def schedule_flush(self):
+        if self.flush_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        delay = max(0.0, self.last_flush + flush_interval - loop.time())
+        self.flush_handle = loop.call_later(delay, self.flush)
+
+    def flush(self):
+        self.flush_handle = None
+        self.last_flush = asyncio.get_running_loop().time()
+        self.stats['broadcasts'] += 1
+        self.encode()
+        for subscriber in self.subscribers:
+            subscriber.offer(self.frames[subscriber.kind])
+
+    def encode(self):
+        data = json.dumps(self.captions.snapshot(), ensure_ascii=False).encode('utf-8')
+        self.frames = {'ws': ws_frame(data), 'sse': b'data: ' + data + b'\n\n'}
+
+    # ---- HTTP：网页、WebSocket、SSE ----
+
+    async def handle_http(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), stall_timeout)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+        lines = request.decode('latin-1').split('\r\n')
+        method, target = (lines[0].split(' ') + ['', ''])[:2]
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        path = target.split('?')[0]
+
+        if method != 'GET':
+            self.respond(writer, '405 Method Not Allowed', 'text/plain', b'')
+        elif path == '/asr' and headers.get('upgrade', '').lower() == 'websocket':
+            await self.serve_websocket(reader, writer, headers)
+        elif path == '/events':
+            await self.serve_sse(reader, writer)
+        elif path in ('/', '/index.html'):
+            with open(page_path, 'rb') as f:
+                self.respond(writer, '200 OK', 'text/html; charset=utf-8', f.read())
+        elif path == '/stats':
+            body = json.dumps(self.summary(), ensure_ascii=False).encode('utf-8')
+            self.respond(writer, '200 OK', 'application/json', body)
+        else:
+            self.respond(writer, '404 Not Found', 'text/plain', b'')
+
+    @staticmethod
+    def respond(writer, status, content_type, body):
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        writer.close()
+
+    async def serve_websocket(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key', '').encode()
+        accept = base64.b64encode(hashlib.sha1(key + ws_guid).digest()).decode()
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        subscriber = Subscriber('ws', writer)
+        # 浏览器发来的数据（录音模式下的音频）读掉不管，只处理 ping 和 close
+        await self.run(subscriber, self.read_websocket(reader, writer))
+
+    @staticmethod
+    async def read_websocket(reader, writer):
+        while True:
+            b0, b1 = await reader.readexactly(2)
+            n = b1 & 0x7f
+            if n == 126:
+                n, = struct.unpack('!H', await reader.readexactly(2))
+            elif n == 127:
+                n, = struct.unpack('!Q', await reader.readexactly(8))
+            mask = await reader.readexactly(4) if b1 & 0x80 else b''
+            payload = await reader.readexactly(n)
+            opcode = b0 & 0x0f
+            if opcode == 0x8:
+                writer.write(ws_frame(b'', 0x8))
+                return
+            if opcode == 0x9:
+                if mask:
+                    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+                writer.write(ws_frame(payload, 0xA))
+
+    async def serve_sse(self, reader, writer):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                     b'Access-Control-Allow-Origin: *\r\n\r\n')
+        subscriber = Subscriber('sse', writer)
+        # SSE 是单向的，读到 EOF 就是客户端断开了
+        await self.run(subscriber, self.wait_eof(reader))
+
+    @staticmethod
+    async def wait_eof(reader):
+        while await reader.read(1024):
+            pass
+
+    async def run(self, subscriber, reading):
+        """登记订阅者，先发当前快照，直到断开或发送超时"""
+        writer = subscriber.writer
+        writer.transport.set_write_buffer_limits(high=write_buffer)
+        if not self.frames:
+            self.encode()
+        subscriber.offer(self.frames[subscriber.kind])
+        self.subscribers.add(subscriber)
+        self.stats['connected'] += 1
+        tasks = [asyncio.ensure_future(subscriber.pump()), asyncio.ensure_future(reading)]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                if isinstance(task.exception(), asyncio.TimeoutError):
+                    self.stats['dropped'] += 1
+        finally:
+            self.subscribers.discard(subscriber)
+            self.stats['coalesced'] += subscriber.coalesced
+            writer.close()
+
+    def summary(self):
+        return {**self.stats, 'clients': len(self.subscribers),
+                'websocket': sum(s.kind == 'ws' for s in self.subscribers),
+                'sse': sum(s.kind == 'sse' for s in self.subscribers),
+                'coalesced': self.stats['coalesced'] + sum(s.coalesced for s in self.subscribers),
+                'udp_targets': len(self.udp_targets),
+                'stale': self.captions.state.stale, 'gaps': self.captions.state.gaps}
+
+    async def serve(self, listen, host, port, log_interval=None):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=('0.0.0.0', listen))
+        server = await asyncio.start_server(self.handle_http, host, port, limit=16 * 1024)
+        print(f'接收字幕：UDP {listen}')
+        print(f'WebSocket：ws://{host}:{port}/asr    SSE：http://{host}:{port}/events    网页：http://{host}:{port}/?watch')
+        for target in self.udp_targets:
+            print(f'转发：UDP {target[0]}:{target[1]}')
+        async with server:
+            while True:
+                await asyncio.sleep(log_interval or 3600)
+                if log_interval:
+                    print(f'\033[90m{time.strftime("%H:%M:%S")} {self.summary()}\033[0m')
+
+
+def parse_target(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把识别结果分发给 WebSocket、SSE、UDP 订阅者')
+    parser.add_argument('--listen', type=int, default=udp_port, help='接收识别进程字幕的 UDP 端口')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=http_port, help='WebSocket / SSE / 网页的端口')
+    parser.add_argument('--udp', action='append', default=[], metavar='HOST:PORT',
+                        help='原样转发到的 UDP 地址，可以多次指定')
+    parser.add_argument('--log-interval', type=float, help='每隔多少秒打印一次连接数等统计')
+    args = parser.parse_args()
+
+    broadcaster = Broadcaster([parse_target(t) for t in args.udp])
+    try:
+        asyncio.run(broadcaster.serve(args.listen, args.host, args.port, args.log_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
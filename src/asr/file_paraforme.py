@@ -1,19 +1,10 @@
 import os
-import soundfile
-from funasr import AutoModel
-from pathlib import Path
-import subprocess
-import wave
-import numpy as np
-import time
+import sys
 
-# 先用 ffmpeg 转格式
-file_path = 'audio/out.mp3'
-wav_path = 'audio/input.mp3'
-command = ['ffmpeg', '-y', '-i', file_path, '-ar', '16000', '-ac', '1', wav_path]
-subprocess.run(command, capture_output=True)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import model_loader
+from utils.decoder import iter_chunks
 
-# 载入模型
 chunk_size = [10, 20, 10] # 左回看，片段，右回看，单位 60ms
 
 home_directory = os.path.expanduser("D:/Cache/model/asr")
@@ -27,48 +18,60 @@ punc_model_revision = "v2.0.4"
 spk_model_path = os.path.join(home_directory,"iic/speech_campplus_sv_zh-cn_16k-common")
 spk_model_revision = "v2.0.4"
 
+# 推理后端：'torch'（funasr.AutoModel）、'onnx'、'onnx-int8'（ONNX Runtime，CPU）
+backend = 'torch'
 ngpu = 1
-device = "cuda"
-ncpu = 4
+device = "auto"   # 有 GPU 用 cuda，否则用 cpu
+ncpu = 4          # CPU 推理线程数（ONNX Runtime 的 intra-op 线程数）
 
 # ASR 模型
-model = AutoModel(model=asr_model_path,
-                  model_revision=asr_model_revision,
-                  vad_model=vad_model_path,
-                  vad_model_revision=vad_model_revision,
-                  punc_model=punc_model_path,
-                  punc_model_revision=punc_model_revision,
-                  spk_model=spk_model_path,
-                  spk_model_revision = spk_model_revision,
-                  ngpu=ngpu,
-                  ncpu=ncpu,
-                  device=device,
-                  disable_pbar=True,
-                  disable_log=True,
-                  disable_update=True
-                  )
+# 在函数里加载，批量转写时每个工作进程各加载一次
+def load_model(backend=backend, device=device, ncpu=ncpu):
+    model, _ = model_loader.load_model(backend=backend,
+                                       warmup=False,
+                                       model=asr_model_path,
+                                       model_revision=asr_model_revision,
+                                       vad_model=vad_model_path,
+                                       vad_model_revision=vad_model_revision,
+                                       punc_model=punc_model_path,
+                                       punc_model_revision=punc_model_revision,
+                                       spk_model=spk_model_path,
+                                       spk_model_revision = spk_model_revision,
+                                       ngpu=ngpu,
+                                       ncpu=ncpu,
+                                       device=device,
+                                       disable_pbar=True,
+                                       disable_log=True,
+                                       disable_update=True
+                                       )
+    return model
 
 ##online asr
-print('开始识别了')
-print(f'chunk_size: {chunk_size}')
-speech, sample_rate = soundfile.read(wav_path)
-speech_length = speech.shape[0]
-sample_offset = 0
-step = chunk_size[1] * 960
-param_dict = {'cache': dict()}
-final_result = ""
-for sample_offset in range(0, speech_length, min(step, speech_length - sample_offset)):
-    if sample_offset + step >= speech_length - 1:
-        step = speech_length - sample_offset
-        is_final = True
-    else:
-        is_final = False
-    param_dict['is_final'] = is_final
-    data = speech[sample_offset: sample_offset + step]
-    data = data.astype(np.float32)
-    rec_result = model.generate(input=data, cache=param_dict['cache'], is_final=param_dict['is_final'])
-    if len(rec_result) > 0:
-       final_result += rec_result[0]["text"]
-    if rec_result:
-        print(rec_result[0]['text'], end='', flush=True)
-print('')
+def transcribe(model, file_path, chunk_size=chunk_size, echo=False):
+    """流式识别一个音视频文件，返回 (文字, 音频时长（秒）)"""
+    # ffmpeg 解码到管道，边解码边识别，不写中间文件；按块读成 float32，不把整个文件读进内存
+    speech_length = 0
+    step = chunk_size[1] * 960
+    param_dict = {'cache': dict()}
+    final_result = ""
+    for data, is_final in iter_chunks(file_path, step):
+        speech_length += len(data)
+        param_dict['is_final'] = is_final
+        rec_result = model.generate(input=data, cache=param_dict['cache'], is_final=param_dict['is_final'])
+        if len(rec_result) > 0:
+           final_result += rec_result[0]["text"]
+        if rec_result and echo:
+            print(rec_result[0]['text'], end='', flush=True)
+    return final_result, speech_length / 16000
+
+
+def main():
+    model = load_model()
+    print('开始识别了')
+    print(f'chunk_size: {chunk_size}')
+    transcribe(model, 'audio/out.mp3', echo=True)
+    print('')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import argparse
+import inspect
+import importlib
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import stub_model
+from utils.decoder import decode
+from utils.replay import session
+from utils.resample import Resampler
+from bench_streaming import scripts, frame_seconds, percentiles
+
+# 不用麦克风，把音频文件按录音时的 60ms 片段喂给流式识别脚本的 recognize()，
+# 把每条虚文字、实文字和它们的延迟记到文件里，用来复现一次有问题的字幕、在无声卡的服务器上做回归
+#
+#   python src/asr/replay_streaming.py audio/zh.mp3 --end 5.2 --end 12 --out replay.jsonl
+#   python src/asr/replay_streaming.py audio/zh.mp3 --speed 0 --compare replay.jsonl
+#
+# --speed 1 实时，2 两倍速，0 不限速（等识别进程跟上，不丢片段）
+# --end 秒数：在音频的这个位置发一次 'end'（相当于录音时按回车），可以多次指定
+# --samplerate 48000：按设备采样率解码，再经过和 record_callback 相同的重采样
+# 输出 jsonl：第一行是配置，之后每行一个事件（preview、final、end），最后一行是汇总
+# --compare 和之前的记录逐条对比实文字，不一致时退出码为 1
+
+
+def record(events, writes):
+    """把 recognize 的事件转成记录：audio 为发出时已收到的音频秒数，latency 为距最新片段写入的毫秒数"""
+    start = writes[0] if len(writes) else 0
+    records = []
+    for event in events:
+        if event['type'] == 'stats':
+            records.append({'type': 'end', 'audio': round(event['frames'] * frame_seconds, 2),
+                            'scheduler': event['scheduler'], 'vad': event['vad'], 'cpu': round(event['cpu'], 3)})
+            continue
+        frame = event['frame']
+        item = {'type': event['type'], 'text': event['text'], 'segment': event['segment'],
+                'audio': round(frame * frame_seconds, 2), 'wall': round(event['time'] - start, 3)}
+        if 0 < frame <= len(writes):
+            item['latency'] = round((event['time'] - writes[frame - 1]) * 1000, 1)
+        records.append(item)
+    return records
+
+
+def summarize(records, writes, dropped):
+    duration = len(writes) * frame_seconds
+    last = [r for r in records if r['type'] == 'end'][-1]
+    summary = {'type': 'summary', 'duration': round(duration, 2), 'dropped': dropped,
+               'rtf': round(last['scheduler']['busy_s'] / duration, 4) if duration else None,
+               'cpu': round(last['cpu'] / duration, 4) if duration else None,
+               'text': ''.join(r['text'] for r in records if r['type'] == 'final')}
+    for kind in ('preview', 'final'):
+        summary[kind] = percentiles([r['latency'] / 1000 for r in records if r['type'] == kind and 'latency' in r])
+    return summary
+
+
+def compare(records, path):
+    """逐条对比实文字，返回不一致的说明"""
+    with open(path, encoding='utf-8') as f:
+        old = [json.loads(line) for line in f if line.strip()]
+    before = [r['text'] for r in old if r['type'] == 'final']
+    after = [r['text'] for r in records if r['type'] == 'final']
+    for i, (a, b) in enumerate(zip(before, after)):
+        if a != b:
+            return [f'第 {i + 1} 条实文字不同：{a!r} -> {b!r}']
+    if len(before) != len(after):
+        return [f'实文字条数不同：{len(before)} -> {len(after)}']
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用音频文件回放流式识别，记录虚文字、实文字和延迟')
+    parser.add_argument('audio')
+    parser.add_argument('--script', default='paraformer', choices=list(scripts))
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，0 为不限速')
+    parser.add_argument('--end', type=float, action='append', default=[], metavar='秒',
+                        help="在音频的这个位置发送 'end'，可以多次指定")
+    parser.add_argument('--samplerate', type=int, default=16000, help='模拟的设备采样率，不是 16000 时经过重采样')
+    parser.add_argument('--chunk-size', type=int, nargs=3, help='默认用脚本里的 chunk_size')
+    parser.add_argument('--pre-expect', type=int, help='初始预测间隔，默认用脚本里的值')
+    parser.add_argument('--stub', action='store_true', help='用假模型，只测管线开销')
+    parser.add_argument('--delay', type=float, default=20, help='假模型每次推理的耗时（毫秒）')
+    parser.add_argument('--out', default='replay.jsonl', help='记录文件')
+    parser.add_argument('--compare', help='和之前的记录对比实文字')
+    args = parser.parse_args()
+
+    module = importlib.import_module(scripts[args.script])
+    defaults = inspect.signature(module.recognize).parameters
+    args.chunk_size = args.chunk_size or list(defaults['chunk_size'].default)
+    args.pre_expect = args.pre_expect or defaults['pre_expect'].default
+    load = partial(stub_model.load_model, delay=args.delay / 1000) if args.stub else module.load_model
+
+    resampler = None
+    if args.samplerate != 16000:
+        resampler = Resampler(args.samplerate, 16000)
+    speech = decode(args.audio, samplerate=args.samplerate)
+    ends = [round(t / frame_seconds) for t in args.end]
+
+    writes, events, dropped = session(module.recognize, speech, args.speed, ends=ends, resampler=resampler,
+                                      load=load, chunk_size=args.chunk_size, pre_expect=args.pre_expect)
+    records = record(events, writes)
+    summary = summarize(records, writes, dropped)
+
+    failures = compare(records, args.compare) if args.compare else []   # 先读旧记录，--out 可能是同一个文件
+    with open(args.out, 'w', encoding='utf-8') as f:
+        for item in [{'type': 'config', **vars(args)}, *records, summary]:
+            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+    print(summary['text'])
+    print(f'\033[90m{summary["duration"]:.1f}s 音频，RTF {summary["rtf"]}，CPU {summary["cpu"]}，'
+          f'丢弃 {dropped} 片段，记录写到 {args.out}\033[0m')
+    for kind in ('preview', 'final'):
+        if summary[kind]:
+            print(f'  {kind:<8} p50 {summary[kind]["p50"]:>7.1f}ms  p95 {summary[kind]["p95"]:>7.1f}ms  ({summary[kind]["n"]} 次)')
+
+    if dropped and args.compare:
+        failures.append(f'回放时丢弃了 {dropped} 个片段，结果不可比，请用 --speed 0')
+    for failure in failures:
+        print(f'\033[31m{failure}\033[0m')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+import sys
+import os
+import socket
+import struct
+import asyncio
+import argparse
+from string import ascii_letters
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.resample import Resampler
+from utils.ring_buffer import AudioRingBuffer
+from utils import model_loader
+
+# 多路流式识别服务
+# 单个进程里常驻一个模型，同时服务多路音频流（会话）
+# 每个会话有自己的片段缓冲和 param_dict 缓存
+# 每个 tick（60ms）收集所有会话里攒够的片段，在推理线程里逐个会话带着各自的 cache 调用 model.generate。
+# 这不是合批推理：AutoModel 带着 vad_model 时，列表输入也是逐条跑的（按 batch_size_s 切 VAD 段），
+# 传 batch_size 不起作用，补齐反而多算静音；一个 tick 只切一次线程，省的是调度开销
+
+# 一路客户端连接就是一个会话，报文格式：
+#   1 字节类型 + 4 字节长度（小端） + 载荷
+#   客户端 -> 服务端：b'F' 音频片段（float32 小端，16000 采样率），b'E' 结束一句
+#   服务端 -> 客户端：b'P' 虚文字（预测），b'T' 实文字，载荷为 utf-8 文本
+header = struct.Struct('<cI')
+
+server_port = 6010
+
+# 单位片段长 60ms，16000 采样率下 960 个采样
+chunk_size = [10, 20, 10]  # 左回看数，总片段数，右回看数
+
+# 每攒够多少个片段预测一次虚文字
+pre_expect = 5
+
+# 每个 tick 的间隔（秒），与一个片段的时长相同
+tick_interval = 0.06
+
+# 将识别到的文字从 udp 端口发送（客户端模式）
+udp_port = 6009
+
+# 一行最多显示多少宽度（每个中文宽度为2，英文字母宽度为1）
+line_width = 50
+
+home_directory = os.path.expanduser("D:/Cache/model/asr")
+asr_model_path = os.path.join(home_directory, "models--FunAudioLLM--SenseVoiceSmall/snapshots/3eb3b4eeffc2f2dde6051b853983753db33e35c3")
+asr_model_revision = "v2.0.4"
+vad_model_path = os.path.join(home_directory,"iic/speech_fsmn_vad_zh-cn-16k-common-pytorch")
+vad_model_revision = "v2.0.4"
+punc_model_path = os.path.join(home_directory,"iic/punc_ct-transformer_zh-cn-common-vocab272727-pytorch")
+punc_model_revision = "v2.0.4"
+
+# 推理后端：'torch'（funasr.AutoModel）、'onnx'、'onnx-int8'（ONNX Runtime，CPU）
+backend = 'torch'
+ngpu = 1
+device = "auto"   # 有 GPU 用 cuda，否则用 cpu
+ncpu = 4          # CPU 推理线程数（ONNX Runtime 的 intra-op 线程数）
+
+
+class Session:
+    """一路音频流的状态"""
+
+    def __init__(self, session_id, writer):
+        self.session_id = session_id
+        self.writer = writer
+        # 推理期间片段还在继续到达，多留几个窗口的余量
+        self.chunks = AudioRingBuffer(chunk_size, capacity_frames=chunk_size[0] + 4 * chunk_size[1])
+        self.param_dict = {'cache': dict()}
+        self.pre_num = 0
+        self.ended = False      # 收到 'end'，需要把剩余片段作为最后一段识别
+        self.closed = False     # 连接已断开
+        self.drained = asyncio.Event()   # tick 取走片段后置位，唤醒等缓冲空间的读取
+
+    def ready_final(self):
+        return self.chunks.frames >= chunk_size[1] or (self.ended and len(self.chunks) > 0)
+
+    def ready_preview(self):
+        return 0 < self.chunks.frames < chunk_size[1] and self.pre_num >= pre_expect and not self.ended
+
+    def take_final(self):
+        # 取出一个完整窗口，多出的片段留到下一个 tick
+        # 推理在另一个线程进行，期间缓冲可能被挪动，所以这里复制出来
+        data = self.chunks.window()[:self.chunks.total].copy()
+        self.chunks.advance(len(data))
+        self.pre_num = 0
+        self.drained.set()
+        return data
+
+    def take_preview(self):
+        self.pre_num = 0
+        return self.chunks.window().copy()
+
+
+class SessionServer:
+    """持有唯一的模型，按 tick 把各会话的片段合批推理"""
+
+    def __init__(self, model):
+        self.model = model
+        self.sessions = {}
+        self.next_id = 0
+        # 推理放在单独的线程里，不阻塞事件循环收包
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.stats = {'ticks': 0, 'rounds': 0, 'finals': 0, 'previews': 0, 'stalls': 0, 'dropped': 0}
+
+    def decode(self, datas, caches):
+        # 一个 tick 里要识别的各会话逐个推理，每个会话带着自己的 cache（流式模型也能用）
+        results = []
+        for data, cache in zip(datas, caches):
+            rec_result = self.model.generate(input=data, cache=cache)
+            results.append(rec_result[0].get('text', '') if rec_result else '')
+        return results
+
+    async def tick(self, loop):
+        self.stats['ticks'] += 1
+
+        # 优先识别实文字，再处理虚文字
+        finals = [s for s in self.sessions.values() if s.ready_final()]
+        if finals:
+            datas = [s.take_final() for s in finals]
+            caches = [s.param_dict['cache'] for s in finals]
+            texts = await loop.run_in_executor(self.executor, self.decode, datas, caches)
+            self.stats['rounds'] += 1
+            self.stats['finals'] += len(finals)
+            for s, text in zip(finals, texts):
+                if text: await self.send(s, b'T', text)
+                if s.ended and not len(s.chunks):
+                    s.ended = False
+                    s.chunks.reset()
+                    s.param_dict = {'cache': dict()}
+                    s.drained.set()
+
+        previews = [s for s in self.sessions.values() if s.ready_preview()]
+        if previews:
+            datas = [s.take_preview() for s in previews]
+            caches = [dict() for _ in previews]   # 虚文字不改动会话自己的 cache
+            texts = await loop.run_in_executor(self.executor, self.decode, datas, caches)
+            self.stats['rounds'] += 1
+            self.stats['previews'] += len(previews)
+            for s, text in zip(previews, texts):
+                if text: await self.send(s, b'P', text)
+
+        # 清理已断开且没有剩余片段的会话
+        for sid in [sid for sid, s in self.sessions.items() if s.closed and not len(s.chunks)]:
+            del self.sessions[sid]
+
+    async def send(self, session, kind, text):
+        if session.closed: return
+        payload = text.encode('utf-8')
+        try:
+            session.writer.write(header.pack(kind, len(payload)) + payload)
+            await session.writer.drain()
+        except ConnectionError:
+            session.closed = True
+
+    async def handle_client(self, reader, writer):
+        session = Session(self.next_id, writer)
+        self.next_id += 1
+        self.sessions[session.session_id] = session
+        print(f'会话 {session.session_id} 已连接：{writer.get_extra_info("peername")}')
+        try:
+            while True:
+                kind, length = header.unpack(await reader.readexactly(header.size))
+                payload = await reader.readexactly(length) if length else b''
+                if kind == b'F':
+                    samples = np.frombuffer(payload, dtype='<f4')
+                    if len(samples) > len(session.chunks.data) - session.chunks.left:
+                        # 比整个缓冲还大的片段永远放不下，丢弃并计数
+                        self.stats['dropped'] += 1
+                        continue
+                    # 识别跟不上时先不读 socket，等 tick 取走一个窗口，
+                    # 由 TCP 流控让客户端慢下来，而不是让缓冲溢出
+                    while session.chunks.free < len(samples):
+                        self.stats['stalls'] += 1
+                        session.drained.clear()
+                        await session.drained.wait()
+                    session.chunks.append(samples)
+                    session.pre_num += 1
+                elif kind == b'E':
+                    if not len(session.chunks):
+                        session.chunks.append(np.zeros(960, dtype=np.float32))
+                    session.ended = True
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            session.closed = True
+            session.ended = True
+            writer.close()
+            print(f'会话 {session.session_id} 已断开')
+
+    async def serve(self, host, port):
+        loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f'识别服务已启动：{host}:{port}')
+        async with server:
+            next_tick = loop.time()
+            while True:
+                await self.tick(loop)
+                next_tick += tick_interval
+                await asyncio.sleep(max(0, next_tick - loop.time()))
+                # 推理耗时超过一个 tick 时，不补跑错过的 tick
+                next_tick = max(next_tick, loop.time())
+
+
+def load_model():
+    return model_loader.load_model(backend=backend,
+                                   model=asr_model_path,
+                                   model_revision=asr_model_revision,
+                                   vad_model=vad_model_path,
+                                   vad_model_revision=vad_model_revision,
+                                   punc_model=punc_model_path,
+                                   punc_model_revision=punc_model_revision,
+                                   ngpu=ngpu,
+                                   ncpu=ncpu,
+                                   device=device,
+                                   disable_pbar=True,
+                                   disable_log=True,
+                                   disable_update=True
+                                   )
+
+
+def serve(args):
+    print('正在加载语音模型')
+    model, timings = load_model()
+    server = SessionServer(model)
+    print(f'模型加载完成（{model_loader.format_timings(timings)}）\n')
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print(f"\n\033[31m收到中断信号 Ctrl+C，退出程序\033[0m {server.stats}")
+
+
+def client(args):
+    # 一个麦克风作为一个会话接入服务端，收到的文字照旧发往本地 udp 端口
+    import threading
+    import sounddevice as sd
+
+    conn = socket.create_connection((args.host, args.port))
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    send_lock = threading.Lock()
+
+    def send(kind, payload=b''):
+        with send_lock:
+            conn.sendall(header.pack(kind, len(payload)) + payload)
+
+    samplerate = int(sd.query_devices(kind='input')['default_samplerate'])
+    resampler = Resampler(samplerate, 16000)
+
+    def record_callback(indata, frames, time_info, status):
+        # 转成单声道、16000采样率
+        data = resampler.process(indata)
+        send(b'F', data.astype('<f4').tobytes())
+
+    def receive():
+        sk = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        f = conn.makefile('rb')
+        行缓冲 = ''
+        printed_num = 0
+        while raw := f.read(header.size):
+            kind, length = header.unpack(raw)
+            text = f.read(length).decode('utf-8')
+            if kind == b'P':
+                sk.sendto((行缓冲+text).encode('utf-8'), ('127.0.0.1', udp_port))
+                print(f'\033[0K\033[32m{行缓冲}\033[33m{text}\033[0m', end='\033[0G', flush=True)
+            elif kind == b'T':
+                if text[-1] in ascii_letters: text += ' '
+                行缓冲 += text
+                sk.sendto(行缓冲.encode('utf-8'), ('127.0.0.1', udp_port))
+                print(f'\033[0K\033[32m{行缓冲}\033[0m', end='\033[0G', flush=True)
+                printed_num += len(text.encode('gbk', errors='replace'))
+                if printed_num >= line_width: print(''); 行缓冲 = ''; printed_num = 0
+        print('\n\033[31m与服务端的连接已断开\033[0m')
+
+    threading.Thread(target=receive, daemon=True).start()
+
+    stream = sd.InputStream(
+        channels=1,
+        dtype="float32",
+        samplerate=samplerate,
+        blocksize=resampler.blocksize,  # 0.06 seconds
+        callback=record_callback
+    ); stream.start()
+
+    print('开始了')
+    try:
+        while True:
+            input()
+            send(b'E')
+    except (KeyboardInterrupt, EOFError):
+        print("\n\033[31m收到中断信号 Ctrl+C，退出程序\033[0m")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多路流式识别服务')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('serve', help='启动识别服务')
+    p.add_argument('--host', default='0.0.0.0')
+    p.add_argument('--port', type=int, default=server_port)
+    p.set_defaults(func=serve)
+
+    p = sub.add_parser('client', help='把本机麦克风作为一个会话接入服务')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=server_port)
+    p.set_defaults(func=client)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
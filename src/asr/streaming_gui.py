@@ -1,11 +1,14 @@
 import sys, os
 from pathlib import Path
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QColor, QFont, QIcon
 from PyQt5.QtWidgets import QApplication, QLabel, QMainWindow, QVBoxLayout, QWidget, QSystemTrayIcon, QMenu, QAction
 from PyQt5.QtNetwork import QUdpSocket
 from rich import inspect
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.caption_protocol import CaptionLines, decode
+
 
 # 窗体属性参考：https://doc.qt.io/qt-6/qt.html#WindowType-enum
 # 控件属性参考：https://doc.qt.io/qt-6/qt.html#WidgetAttribute-enum
@@ -15,6 +18,12 @@ from rich import inspect
 # 通过 udp 端口接收文字，并更新显示
 udp_port = 6009
 
+# 除了当前行，再显示最近几行已完成的字幕
+scrollback = 2
+
+# 刷新显示的频率（次/秒），None 为跟随屏幕刷新率
+refresh_rate = None
+
 class TransparentWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -22,6 +31,7 @@ class TransparentWindow(QMainWindow):
         # 设置窗口属性
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.SplashScreen) #   
         self.setAttribute(Qt.WA_TranslucentBackground, True)
+        self.style_cache = (None, None)   # (style.css 的修改时间, 内容)
         self.setStyleSheet(self.get_style())
         
 
@@ -48,6 +58,16 @@ class TransparentWindow(QMainWindow):
         self.tray_icon.setToolTip("悬浮窗口")
         self.tray_icon.activated.connect(self.tray_trigger)
 
+        # 收到数据报只更新字幕状态，由定时器按屏幕刷新率把最新状态画出来，
+        # 预测密集时不会每个数据报都重新排版、重绘一次
+        self.captions = CaptionLines(scrollback)   # 按序号应用增量消息，丢弃过期的
+        self.shown = None
+        hz = refresh_rate or QApplication.primaryScreen().refreshRate() or 60
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(max(1, int(1000 / hz)))
+        self.render_timer.timeout.connect(self.render)
+
         # 绑定 udp 端口
         self.udp_socket = QUdpSocket(self)
         self.udp_socket.bind(udp_port)
@@ -65,14 +85,22 @@ class TransparentWindow(QMainWindow):
             size = self.udp_socket.pendingDatagramSize()
             data, host, port = self.udp_socket.readDatagram(size)
 
-            # 将接收到的数据转换为字符串并更新标签内容
+            # 增量消息按序应用到当前行；旧的纯文本数据报当作整行
             try:
-                message = data.decode("utf-8")
-                if message:
-                    self.label.setText(f"{message}")
+                if self.captions.apply(decode(data)) and not self.render_timer.isActive():
+                    self.render_timer.start()
             except Exception as e:
                 print(e)
 
+    def render(self):
+        committed, partial = self.captions.current
+        lines = [*self.captions.lines, committed + partial]
+        if lines == self.shown: return
+        self.label.setText('\n'.join(lines))
+        if self.shown is None or len(lines) != len(self.shown):
+            self.resize(self.width(), self.sizeHint().height())   # 行数变了才调整窗体高度
+        self.shown = lines
+
     def create_context_menu(self):
         self.menu = QMenu(self)
         switch_transparency_action = QAction("更新外观", self)
@@ -94,18 +122,22 @@ class TransparentWindow(QMainWindow):
         self.tray_icon.setContextMenu(self.menu)
 
     def update_style(self):
-        self.setStyleSheet(self.get_style())    # 更新 style
+        style = self.get_style()
+        if style != self.styleSheet():
+            self.setStyleSheet(style)           # 更新 style，内容没变就不让 Qt 重新解析
         self.resize(self.label.sizeHint())      # 更新窗体大小
         self.update()
     
     def get_style(self):
+        # style.css 没改过就用缓存的内容，不重复读盘
         style = "QLabel { color: green; background-color: rgba(0, 0, 0, 0%); }"
         style_path = Path('style.css')
-        if style_path.exists:
-            with open (style_path, 'r', encoding='utf-8') as f: style = f.read()
-        else:
+        if not style_path.exists():
             with open (style_path, 'w', encoding='utf-8') as f: f.write(style)
-        return style
+        mtime = style_path.stat().st_mtime
+        if mtime != self.style_cache[0]:
+            with open (style_path, 'r', encoding='utf-8') as f: self.style_cache = (mtime, f.read())
+        return self.style_cache[1]
 
     def quit_application(self):
         self.tray_icon.hide()
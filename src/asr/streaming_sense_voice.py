@@ -1,19 +1,31 @@
 import sys 
+import os
 import time
-import wave
 import socket
 from multiprocessing import Process, Queue 
 from string import ascii_letters
-from copy import deepcopy
 
 import numpy as np
-import sounddevice as sd
+try:
+    import sounddevice as sd
+except OSError:   # 没有 PortAudio（无声卡的服务器），只能用 replay_streaming.py 回放文件
+    sd = None
 from rich.console import Console
-# from funasr_onnx.paraformer_online_bin import Paraformer
 import colorama; colorama.init()
 console = Console()
 import signal 
-from funasr import AutoModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.stream_cache import PreviewDecoder, is_streaming
+from utils.resample import Resampler
+from utils.ring_buffer import AudioRingBuffer
+from utils.shm_ring import ShmAudioRing
+from utils.archive import ArchiveWriter
+from utils.scheduler import PreviewScheduler
+from utils.vad import StreamingVAD
+from utils.metrics import Metrics
+from utils.caption_protocol import CaptionEncoder
+from utils import model_loader
 
 # paraformer 的单位片段长 60ms，在 16000 采样率下，就是 960 个采样
 # 它的 chunk_size ，如果设为 [10, 20, 10]
@@ -25,14 +37,12 @@ from funasr import AutoModel
 
 # 将识别到的文字从 udp 端口发送
 udp_port = 6009
+# 'delta'：带会话、序号、段号的增量消息（utils/caption_protocol.py）；'text'：整行纯文本，兼容旧的接收端
+caption_format = 'delta'
 
 # 一行最多显示多少宽度（每个中文宽度为2，英文字母宽度为1）
 line_width = 50
 
-# 在 recognize 函数开始处添加
-from modelscope import snapshot_download
-import os
-
 
 # home_directory = os.path.expanduser("~")
 # asr_model_path = os.path.join(home_directory, ".cache", "modelscope", "hub", "models", "iic", "speech_seaco_paraformer_large_asr_nat-zh-cn-16k-common-vocab8404-pytorch")
@@ -48,9 +58,19 @@ punc_model_revision = "v2.0.4"
 spk_model_path = os.path.join(home_directory,"iic/speech_campplus_sv_zh-cn_16k-common")
 spk_model_revision = "v2.0.4"
 
+# 推理后端：'torch'（funasr.AutoModel）、'onnx'、'onnx-int8'（ONNX Runtime，CPU）
+backend = 'torch'
 ngpu = 1
-device = "cuda"
-ncpu = 4
+device = "auto"   # 有 GPU 用 cuda，否则用 cpu
+ncpu = 4          # CPU 推理线程数（ONNX Runtime 的 intra-op 线程数）
+
+# 识别前的端点检测：'energy' 按能量判断，'fsmn' 用上面的 FSMN-VAD 模型流式判断，None 不做检测
+vad_mode = 'energy'
+
+# 各环节耗时统计（utils/metrics.py）：Prometheus 格式的 /metrics 端口，默认 None 不开，需要时设成 9109 等端口；
+# 定时在控制台打印一行统计的间隔（秒），None 不打印
+metrics_port = None
+metrics_log_interval = None
 
 # 检查模型是否存在，不存在则下载
 # model_dir = asr_model_path
@@ -60,103 +80,185 @@ ncpu = 4
 #                         cache_dir=home_directory)
 
 # ASR 模型 - SenseVoiceSmall 不支持时间戳和说话人分离，简化配置
-model = AutoModel(model=asr_model_path,
-                  model_revision=asr_model_revision,
-                  vad_model=vad_model_path,
-                  vad_model_revision=vad_model_revision,
-                  punc_model=punc_model_path,
-                  punc_model_revision=punc_model_revision,
-                  # 移除 spk_model 配置，SenseVoiceSmall 不支持说话人分离
-                  # spk_model=spk_model_path,
-                  # spk_model_revision = spk_model_revision,
-                  ngpu=ngpu,
-                  ncpu=ncpu,
-                  device=device,
-                  disable_pbar=True,
-                  disable_log=True,
-                  disable_update=True
-                  )
-
-def recognize(queue_in: Queue, queue_out: Queue):     
+# 只在识别进程里调用：spawn 方式下子进程会重新导入本模块，放在顶层会在父子进程各加载一遍
+# 返回 (模型, 各阶段耗时)，加载后先预热一次
+def load_model():
+    return model_loader.load_model(
+        backend=backend,
+        model=asr_model_path,
+        model_revision=asr_model_revision,
+        vad_model=vad_model_path,
+        vad_model_revision=vad_model_revision,
+        punc_model=punc_model_path,
+        punc_model_revision=punc_model_revision,
+        # 移除 spk_model 配置，SenseVoiceSmall 不支持说话人分离
+        # spk_model=spk_model_path,
+        # spk_model_revision = spk_model_revision,
+        ngpu=ngpu,
+        ncpu=ncpu,
+        device=device,
+        disable_pbar=True,
+        disable_log=True,
+        disable_update=True
+    )
+
+def load_vad_model():
+    model, _ = model_loader.load_model(warmup=False,
+                                       model=vad_model_path, model_revision=vad_model_revision,
+                                       ngpu=ngpu, ncpu=ncpu, device=device,
+                                       disable_pbar=True, disable_log=True, disable_update=True)
+    return model
+
+# load 为模型工厂，返回 (模型, 各阶段耗时)，压测时可以换成假模型（utils/stub_model.py）
+# events=True 时把每次预测、实文字作为事件发到 queue_out，供压测统计延迟；echo=False 时不在控制台打印
+def recognize(queue_in: ShmAudioRing, queue_out: Queue, load=load_model,
+              chunk_size=(10, 50, 10), pre_expect=10, events=False, echo=True,
+              metrics_port=metrics_port):
     # 创建一个 udp socket，用于实时发送文字
     sk = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-    chunk_size = [10, 50, 10] # 左回看数，总片段数，右回看数。每片段长 60ms
+    chunk_size = list(chunk_size) # 左回看数，总片段数，右回看数。每片段长 60ms
 
-    # 通知主进程，可以开始了
-    queue_out.put(True)
+    # 模型只在识别进程里加载，预热完再通知主进程可以开始了
+    model, timings = load()
+    queue_out.put(timings)
 
-    # 每攒够 5 个片段，就预测一下虚文字
-    pre_num = 0; pre_expect = 10
+    # 每攒够 pre_expect 个片段，就预测一下虚文字
+    # 这只是初始间隔，之后由调度器根据推理耗时和积压动态调整
+    scheduler = PreviewScheduler(chunk_size, cadence=pre_expect)
     printed_num = 0   # 记录一行已输出多少个字
-    chunks = []
+    chunks = AudioRingBuffer(chunk_size)   # 预分配的音频缓冲，代替片段列表
     param_dict = {'cache': dict()}
+    preview = PreviewDecoder(model, streaming=is_streaming(asr_model_path))
+    vad = StreamingVAD(vad_mode, model=load_vad_model() if vad_mode == 'fsmn' else None)
     行缓冲 = ''
     旧预测 = ''
+    received = 0      # 收到的片段数
+    onset = 0         # 当前这段语音开始时收到的片段数
+    cpu_start = time.process_time()   # 不算加载模型的 CPU 时间
+    frame_time = time.perf_counter()  # 最新一个片段的采集时刻
+
+    # 计数器和队列深度在抓取时才读，不在每个片段上累加
+    metrics = Metrics()
+    metrics.collect(lambda: {
+        'frames_total': received,
+        'speech_frames_total': vad.counters['speech_frames'],
+        'previews_total': scheduler.counters['previews'],
+        'previews_skipped_total': scheduler.counters['skipped_lag'] + scheduler.counters['skipped_window'],
+        'finals_total': scheduler.counters['finals'],
+        'dropped_total': queue_in.dropped,
+        'queue_depth': queue_in.qsize(),
+        'preview_cadence': scheduler.counters['cadence'],
+    })
+    if metrics_port:
+        try: metrics.serve(metrics_port)
+        except OSError as e: print(f'统计端口 {metrics_port} 打不开：{e}')
+    if metrics_log_interval:
+        metrics.log_every(metrics_log_interval)
+
+    encoder = CaptionEncoder()
+
+    def send(kind, text):
+        # kind 为 'partial'（虚文字）或 'final'（实文字），text 为这次新增的文字
+        start = time.perf_counter()
+        if caption_format == 'delta':
+            payload = getattr(encoder, kind)(text, captured=frame_time)
+        else:
+            payload = (行缓冲 + text if kind == 'partial' else 行缓冲).encode('utf-8')
+        if payload is None: return
+        sk.sendto(payload, ('127.0.0.1', udp_port))
+        end = time.perf_counter()
+        metrics.observe('send', end - start)
+        metrics.observe('caption', end - frame_time)   # 从采集到发出的端到端延迟
+
+    def emit(kind, text):
+        if events:
+            queue_out.put({'type': kind, 'text': text, 'frame': received, 'onset': onset,
+                           'segment': vad.counters['segments'], 'time': time.perf_counter()})
+
     while instruction := queue_in.get() :
         match instruction['type']:
             case 'feed':
-                # 吃下片段
-                chunks.append(instruction['samples'])
-                pre_num += 1
-
-                # 显示虚文字
-                if len(chunks) < chunk_size[1] and pre_num == pre_expect and queue_in.qsize() < 3:
-                    pre_num = 0
-                    data = np.concatenate(chunks)
-                    虚字典 = deepcopy(param_dict)
-                    虚字典['is_final'] = True 
-
-                    # 修改推理调用方式
-                    rec_result = model.generate(input=data, cache=虚字典.get('cache', {}))
-                    if rec_result and rec_result[0].get('text'):
-                        预测 = rec_result[0]['text']
+                received += 1
+                frame_time = instruction['time']
+                metrics.observe('queue', time.perf_counter() - frame_time)
+                # 端点检测：静音片段直接丢弃，语音片段（含前导和拖尾）才送去识别
+                segments = vad.counters['segments']
+                for 片段, 语音结束 in vad.feed(instruction['samples']):
+                    if vad.counters['segments'] != segments:
+                        segments = vad.counters['segments']
+                        onset = received
+                    # 吃下片段
+                    chunks.append(片段)
+
+                    # 显示虚文字
+                    if not 语音结束 and scheduler.should_preview(chunks.frames, queue_in.qsize()):
+                        # 只解码新到的片段：流式模型接着预测分支的缓存，非流式模型带上一小段左语境
+                        with scheduler.timed('preview'), metrics.timed('preview'):
+                            预测 = preview.decode(chunks.window(), param_dict['cache'])
                         if 预测 and 预测 != 旧预测: 
                             旧预测 = 预测
-                            sk.sendto((行缓冲+预测).encode('utf-8'), ('127.0.0.1', udp_port))  # 网络发送
-                            print(f'\033[0K\033[32m{行缓冲}\033[33m{预测}\033[0m',             # 控制台打印
-                                  end=f'\033[0G', flush=True)
-                elif pre_num == 5: pre_num = 0
-
-                # 显示实文字
-                if len(chunks) == chunk_size[1]:
-                    data = np.concatenate(chunks)
-                    rec_result = model.generate(input=data, cache=param_dict.get('cache', {}))
-                    if rec_result and rec_result[0].get('text'):
-                        文字 = rec_result[0]['text']                   # 得到文字
-                        if 文字 and 文字[-1] in ascii_letters: 文字 += ' '  # 英文后面加空格
-                        行缓冲 += 文字                                      # 加入缓冲
-                        sk.sendto(行缓冲.encode('utf-8'), ('127.0.0.1', udp_port))           # 网络发送
-                        print(f'\033[0K\033[32m{行缓冲}\033[0m', end='\033[0G', flush=True)  # 控制台打印
-                        printed_num += len(文字.encode('utf-8'))              # 统计数字
-                        if printed_num >= line_width: print(''); 行缓冲 = ''; printed_num=0    # 每到长度极限，就清空换行
-                    chunks.clear()
+                            send('partial', 预测)                                                # 网络发送
+                            emit('preview', 预测)
+                            if echo: print(f'\033[0K\033[32m{行缓冲}\033[33m{预测}\033[0m',   # 控制台打印
+                                           end=f'\033[0G', flush=True)
+
+                    # 显示实文字：窗口凑满，或者一段语音结束
+                    if chunks.frames == chunk_size[1] or 语音结束:
+                        data = chunks.window()
+                        with scheduler.timed('final'), metrics.timed('final'):
+                            rec_result = model.generate(input=data, cache=param_dict.get('cache', {}))
+                        if rec_result and rec_result[0].get('text'):
+                            文字 = rec_result[0]['text']                   # 得到文字
+                            if 文字 and 文字[-1] in ascii_letters: 文字 += ' '  # 英文后面加空格
+                            行缓冲 += 文字                                      # 加入缓冲
+                            send('final', 文字)                                                 # 网络发送
+                            emit('final', 文字)
+                            if echo: print(f'\033[0K\033[32m{行缓冲}\033[0m', end='\033[0G', flush=True)  # 控制台打印
+                            printed_num += len(文字.encode('utf-8'))              # 统计数字
+                            if printed_num >= line_width:                      # 每到长度极限，就清空换行
+                                if echo: print('')
+                                行缓冲 = ''; printed_num=0; encoder.new_segment()
+                        chunks.advance()     # 窗口并入左回看
+                        preview.rollback()   # 丢弃预测分支
+                        if 语音结束:
+                            param_dict = {'cache': dict()}   # 一段语音结束，下一段重新开始
 
             case 'end': 
                 if not chunks:
                     chunks.append(np.zeros(960, dtype=np.float32))
-                data = np.concatenate(chunks)
-                rec_result = model.generate(input=data, cache=param_dict.get('cache', {}))
+                data = chunks.window()
+                with scheduler.timed('final'), metrics.timed('final'):
+                    rec_result = model.generate(input=data, cache=param_dict.get('cache', {}))
                 if rec_result and rec_result[0].get('text'): 
-                    print(rec_result[0]['text'], end='', flush=True)
-                chunks.clear()
+                    emit('final', rec_result[0]['text'])
+                    if echo: print(rec_result[0]['text'], end='', flush=True)
+                chunks.reset()
                 param_dict = {'cache': dict()}
-                print('\n\n')
+                preview.rollback()
+                vad.reset()
+                if events:
+                    queue_out.put({'type': 'stats', 'frames': received, 'scheduler': scheduler.stats(),
+                                   'vad': dict(vad.counters), 'cpu': time.process_time() - cpu_start})
+                if echo: print(f'\n\033[90m{scheduler.stats()} {vad.counters}\033[0m\n')
+
+            case 'stop':
+                break
                 
         
 
 def record_callback(indata: np.ndarray, 
                     frames: int, time_info, 
-                    status: sd.CallbackFlags) -> None:
+                    status: 'sd.CallbackFlags') -> None:
     
-    # 转成单声道、16000采样率
-    data = np.mean(indata.copy()[::3], axis=1)
+    # 转成单声道、16000采样率（带抗混叠滤波，结果写在预分配的缓冲里）
+    data = resampler.process(indata)
 
-    # 放入队列
-    queue_in.put({'type':'feed', 'samples':data})
+    # 写入共享内存环形缓冲，不阻塞、不序列化
+    queue_in.write(data)
 
-    # 保存音频
-    f.writeframes((data * (2**15-1)).astype(np.int16).tobytes())
+    # 保存音频（只拷进缓冲，由后台线程写盘）
+    archive.write(data)
 
 
     
@@ -166,18 +268,20 @@ def main():
     signal.signal(signal.SIGINT, signal_handler)
 
     global queue_in, queue_out
-    queue_in = Queue()
+    queue_in = ShmAudioRing()    # 音频走共享内存，控制消息走旁路小队列
     queue_out = Queue()
     process = Process(target=recognize, args=[queue_in, queue_out], daemon=True)
     process.start()
 
     # 等待模型加载完
-    print('正在加载语音模型');queue_out.get()
-    print(f'模型加载完成\n\n')
+    print('正在加载语音模型');timings = queue_out.get()
+    print(f'模型加载完成（{model_loader.format_timings(timings)}）\n\n')
 
+    samplerate = 48000
     try:
         device = sd.query_devices(kind='input')
         channels = device['max_input_channels']
+        samplerate = int(device['default_samplerate'])
         console.print(f'使用默认音频设备：[italic]{device["name"]}', end='\n\n')
     except UnicodeDecodeError:
         console.print("由于编码问题，暂时无法获得麦克风设备名字", end='\n\n', style='bright_red')
@@ -185,27 +289,32 @@ def main():
         console.print("没有找到麦克风设备", end='\n\n', style='bright_red')
         input('按回车键退出'); sys.exit()
     
-    # 将音频保存到 wav，以作检查用
-    global f
-    f = wave.open('audio/out.wav', 'w')
-    f.setnchannels(1)
-    f.setsampwidth(2)
-    f.setframerate(16000)
-
-    # 我们原生录制的是 48000 采样率的，便于以后保存高品质录音
-    # 可后续处理为 16000 采样率
+    # 将音频按段存档到 audio/archive，以作检查用
+    global archive
+    archive = ArchiveWriter('audio/archive').start()
+
+    # 按设备默认采样率录制（44.1k、48k、96k 等），在回调里重采样为 16000
+    global resampler
+    resampler = Resampler(samplerate, 16000)
     stream = sd.InputStream(
         channels=1,
         dtype="float32",
-        samplerate=48000,
-        blocksize=int(3 * 960),  # 0.06 seconds
+        samplerate=samplerate,
+        blocksize=resampler.blocksize,  # 0.06 seconds
         callback=record_callback
     ); stream.start()
 
     print('开始了')
-    while True:
-        input()
-        queue_in.put({'type': 'end'})
+    try:
+        while True:
+            input()
+            queue_in.put({'type': 'end'})
+    finally:
+        stream.stop()
+        archive.close()
+        if queue_in.dropped: print(f'\n共丢弃 {queue_in.dropped} 个片段')
+        if archive.dropped: print(f'\n存档共丢弃 {archive.dropped} 个片段')
+        queue_in.close()
 
 if __name__ == '__main__':
     main()
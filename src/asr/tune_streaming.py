@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import string
+import argparse
+import importlib
+import itertools
+import multiprocessing as mp
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import stub_model
+from utils.decoder import decode
+from utils.replay import session
+from bench_streaming import scripts, frame_seconds, percentiles, latencies
+from batch_transcribe import find_files
+
+# 流式识别参数调优：在带标注的语料上扫 chunk_size 和 pre_expect，列出延迟、CPU、字错率的帕累托前沿
+#
+#   python src/asr/tune_streaming.py --manifest corpus.jsonl --size 10 20 30 50 --pre-expect 3 5 10 --workers 4
+#   python src/asr/tune_streaming.py audio/labelled --script sense_voice --json tune.json
+#
+# 语料：jsonl 清单，每行 {"audio": 路径, "text": 标注}；或者一个目录，每个音频旁边放同名的 .txt 标注。
+# 每组参数由一个工作进程负责：只加载一次模型，把语料首尾相接按实时节奏回放（每个文件之后发 'end'，
+# 识别进程的缓存、端点检测都会重置），统计：
+#   - final_p95 / preview_p95：实文字、虚文字距离最新片段写入的毫秒数
+#   - cpu：识别进程的 CPU 秒数 / 音频秒数
+#   - cer：字错率（去掉标点、空白，英文转小写后按字计算编辑距离）
+# 最后打印所有组合，帕累托最优（没有任何一组在各项上都不比它差且至少一项更好）的标 *。
+# 各工作进程平分 CPU 核（OMP_NUM_THREADS 等），结果受机器影响，请在目标机器上跑。
+
+punctuation = set(string.punctuation + string.whitespace + '，。！？、；：“”‘’（）《》【】…—·')
+objectives = ('final_p95', 'preview_p95', 'cpu', 'cer')
+
+# 工作进程里解码好的语料
+corpus = {}
+
+
+def read_corpus(source):
+    """返回 [(音频路径, 标注文字)]"""
+    items = []
+    if os.path.isdir(source):
+        for path in find_files(source):
+            label = os.path.splitext(path)[0] + '.txt'
+            if os.path.exists(label):
+                with open(label, encoding='utf-8') as f:
+                    items.append((path, f.read().strip()))
+        return items
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                items.append((item.get('audio') or item['path'], item['text']))
+    return items
+
+
+def normalize(text):
+    return [c for c in text.lower() if c not in punctuation]
+
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+
+def run_config(script, chunk_size, pre_expect, items, speed, threads, stub_delay=None):
+    """在工作进程里跑一组参数，返回各项指标"""
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    module = importlib.import_module(scripts[script])
+    load = partial(stub_model.load_model, delay=stub_delay / 1000) if stub_delay is not None else module.load_model
+
+    # 各文件补齐到整片段后首尾相接，文件边界处发 'end'
+    frame = 960
+    speeches = []
+    for path, _ in items:
+        if path not in corpus:
+            speech = decode(path)
+            corpus[path] = np.pad(speech, (0, -len(speech) % frame))
+        speeches.append(corpus[path])
+    ends = [int(n) for n in np.cumsum([len(s) // frame for s in speeches])[:-1]]
+    writes, events, dropped = session(module.recognize, np.concatenate(speeches), speed, ends=ends,
+                                      load=load, chunk_size=chunk_size, pre_expect=pre_expect)
+
+    # 每个 'stats' 之前的实文字属于一个文件
+    texts, current = [], []
+    for event in events:
+        if event['type'] == 'final':
+            current.append(event['text'])
+        elif event['type'] == 'stats':
+            texts.append(''.join(current))
+            current = []
+    errors = chars = 0
+    for (_, reference), text in zip(items, texts):
+        reference = normalize(reference)
+        errors += edit_distance(reference, normalize(text))
+        chars += len(reference)
+
+    duration = len(writes) * frame_seconds
+    latency = {k: percentiles(v) for k, v in latencies(events, writes).items()}
+    return {'chunk_size': list(chunk_size), 'pre_expect': pre_expect, 'duration': round(duration, 2),
+            'dropped': dropped,
+            'final_p50': latency['final']['p50'] if latency['final'] else None,
+            'final_p95': latency['final']['p95'] if latency['final'] else None,
+            'preview_p50': latency['preview']['p50'] if latency['preview'] else None,
+            'preview_p95': latency['preview']['p95'] if latency['preview'] else None,
+            'cpu': round(events[-1]['cpu'] / duration, 4),
+            'cer': round(errors / chars, 4) if chars else None}
+
+
+def pareto(results, keys=objectives):
+    """各项都越小越好，缺失的指标（比如没有虚文字）当作最差"""
+    def value(result, key):
+        return float('inf') if result[key] is None else result[key]
+
+    front = []
+    for a in results:
+        dominated = any(all(value(b, k) <= value(a, k) for k in keys) and any(value(b, k) < value(a, k) for k in keys)
+                        for b in results if b is not a)
+        if not dominated:
+            front.append(a)
+    return front
+
+
+def main():
+    parser = argparse.ArgumentParser(description='扫流式识别的 chunk_size、pre_expect，列出帕累托最优的组合')
+    parser.add_argument('corpus', nargs='?', help='带同名 .txt 标注的音频目录')
+    parser.add_argument('--manifest', help='jsonl 清单，每行 {"audio": 路径, "text": 标注}')
+    parser.add_argument('--script', default='paraformer', choices=list(scripts))
+    parser.add_argument('--left', type=int, nargs='+', default=[10], help='左回看片段数')
+    parser.add_argument('--size', type=int, nargs='+', default=[10, 20, 30, 50], help='窗口片段数')
+    parser.add_argument('--right', type=int, nargs='+', default=[5, 10], help='右回看片段数')
+    parser.add_argument('--pre-expect', type=int, nargs='+', default=[3, 5, 10], help='预测虚文字的间隔')
+    parser.add_argument('--workers', type=int, default=2, help='同时跑几组参数')
+    parser.add_argument('--threads', type=int, help='每组的推理线程数，默认 CPU 核数 / 进程数')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，延迟要按实时测，0 为不限速')
+    parser.add_argument('--stub', action='store_true', help='用假模型，只测管线开销（字错率没有意义）')
+    parser.add_argument('--delay', type=float, default=20, help='假模型每次推理的耗时（毫秒）')
+    parser.add_argument('--objectives', nargs='+', default=list(objectives), choices=objectives)
+    parser.add_argument('--json', help='结果另存为 json')
+    args = parser.parse_args()
+
+    if not (args.corpus or args.manifest):
+        parser.error('请指定语料目录或 --manifest')
+    items = read_corpus(args.manifest or args.corpus)
+    if not items:
+        print('没有找到带标注的音频'); return
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    # 窗口不比预测间隔长的组合不会出虚文字，跳过
+    configs = [((left, size, right), pre) for left, size, right, pre
+               in itertools.product(args.left, args.size, args.right, args.pre_expect) if pre < size]
+    print(f'{len(items)} 个文件，{len(configs)} 组参数，{args.workers} 个进程，每个 {threads} 线程')
+
+    results = []
+    ctx = mp.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx) as pool:
+        futures = {pool.submit(run_config, args.script, chunk_size, pre, items, args.speed, threads,
+                               args.delay if args.stub else None): (chunk_size, pre) for chunk_size, pre in configs}
+        for future in as_completed(futures):
+            chunk_size, pre = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f'\033[31m{list(chunk_size)} pre_expect={pre} 失败：{e}\033[0m')
+                continue
+            results.append(result)
+            print(f'\033[90m{list(chunk_size)} pre_expect={pre} 完成（{len(results)}/{len(configs)}）\033[0m')
+
+    if not results:
+        return
+    front = pareto(results, args.objectives)
+    results.sort(key=lambda r: (r not in front, r['final_p95'] or float('inf')))
+    print(f'\n{"":2}{"chunk_size":<14}{"pre":>4}{"final p50":>11}{"final p95":>11}{"preview p95":>13}{"cpu":>8}{"cer":>8}')
+    def fmt(value, spec, width):
+        return (format(value, spec) if value is not None else '-').rjust(width)
+
+    for r in results:
+        print(f'{"*" if r in front else "":2}{str(r["chunk_size"]):<14}{r["pre_expect"]:>4}'
+              f'{fmt(r["final_p50"], ".0f", 9)}ms{fmt(r["final_p95"], ".0f", 9)}ms{fmt(r["preview_p95"], ".0f", 11)}ms'
+              f'{fmt(r["cpu"], ".3f", 8)}{fmt(r["cer"], ".2%", 8)}')
+    if any(r['dropped'] for r in results):
+        print('\033[31m有的组合回放时丢弃了片段（识别跟不上），它们的字错率偏高\033[0m')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': results, 'pareto': front}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import wave
+import threading
+from bisect import bisect_right
+from datetime import datetime
+
+import numpy as np
+
+# 录音存档
+#
+# 原先在 PortAudio 回调里直接 f.writeframes(...) 写 audio/out.wav，
+# 实时线程上做同步磁盘 I/O，磁盘一卡就会丢音频；每次启动覆盖上一次的录音，长时间运行文件无限增长。
+#
+# 这里回调只把片段拷进预分配的环形缓冲（同一进程里的线程之间，用 threading.Condition 保护，
+# 持锁时只做一次内存拷贝），由后台线程取出来写盘：
+#   - 按时长切分文件（默认 10 分钟一段），文件名带开始时间，不再覆盖
+#   - 装了 soundfile 时用 FLAC 无损压缩，否则退回 WAV
+#   - 每段开始时在 index.jsonl 里记一行（samples 为 null），结束时再记一行带上采样数，
+#     同一个文件以最后一行为准；进程中途退出时正在写的那段也能用 locate() 按时间戳找到
+#   - 最多保留 keep 段（默认 144 段，10 分钟一段即一天），更早的连同索引一起删掉
+#   - 写盘跟不上、缓冲满时丢弃片段并计数（dropped）
+
+
+class ArchiveWriter:
+
+    def __init__(self, directory='audio/archive', samplerate=16000, segment_seconds=600,
+                 compress=True, keep=144, frame=960, buffer_seconds=30):
+        self.directory = directory
+        self.samplerate = samplerate
+        self.segment_samples = segment_seconds * samplerate
+        self.keep = keep            # 最多保留多少段，None 表示全部保留
+        self.frame = frame
+        self.buffer = np.zeros((buffer_seconds * samplerate // frame, frame), dtype=np.float32)
+        self.head = 0               # 已写入缓冲的片段数
+        self.tail = 0               # 已写盘的片段数
+        self.dropped = 0
+        self.stopping = False
+        self.condition = threading.Condition()
+        try:
+            import soundfile
+            self.soundfile = soundfile if compress else None
+        except ImportError:
+            self.soundfile = None
+        self.file = None
+        self.thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.started = time.time()
+        self.written = 0          # 已写入的采样数（所有段累计）
+        self.thread = threading.Thread(target=self._run, name='archive-writer', daemon=True)
+        self.thread.start()
+        return self
+
+    def write(self, samples):
+        """在音频回调里调用：只拷贝进环形缓冲，不做磁盘 I/O，缓冲满时丢弃"""
+        with self.condition:
+            if self.head - self.tail >= len(self.buffer):
+                self.dropped += 1
+                return
+            self.buffer[self.head % len(self.buffer)] = samples
+            self.head += 1
+            self.condition.notify()
+
+    def close(self):
+        if self.thread is None: return
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join()
+        self.thread = None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.head > self.tail or self.stopping)
+                if self.head == self.tail:
+                    break
+            # 这个位置在 tail 前移之前不会被回调覆盖，可以不持锁写盘
+            self._write(self.buffer[self.tail % len(self.buffer)])
+            with self.condition:
+                self.tail += 1
+        self._close_segment()
+
+    def _write(self, samples):
+        if self.file is None:
+            self._open_segment()
+        if self.soundfile:
+            self.file.write(samples)
+        else:
+            self.file.writeframes((samples * (2**15-1)).astype(np.int16).tobytes())
+        self.segment_written += len(samples)
+        self.written += len(samples)
+        if self.segment_written >= self.segment_samples:
+            self._close_segment()
+
+    def _open_segment(self):
+        # 丢掉的片段也算进时间轴，保证时间戳和真实时间对得上
+        self.segment_start = self.started + (self.written + self.dropped * self.frame) / self.samplerate
+        self.segment_start_sample = self.written
+        self.segment_written = 0
+        stamp = datetime.fromtimestamp(self.segment_start).strftime('%Y%m%d-%H%M%S')
+        if self.soundfile:
+            self.segment_path = os.path.join(self.directory, f'{stamp}.flac')
+            self.file = self.soundfile.SoundFile(self.segment_path, 'w', self.samplerate, 1,
+                                                 format='FLAC', subtype='PCM_16')
+        else:
+            self.segment_path = os.path.join(self.directory, f'{stamp}.wav')
+            self.file = wave.open(self.segment_path, 'w')
+            self.file.setnchannels(1)
+            self.file.setsampwidth(2)
+            self.file.setframerate(self.samplerate)
+        self._index(None)
+
+    def _close_segment(self):
+        if self.file is None: return
+        self.file.close()
+        self.file = None
+        self._index(self.segment_written)
+        if self.keep:
+            self._prune()
+
+    def _index(self, samples):
+        # samples 为 None 表示这一段还在写
+        with open(os.path.join(self.directory, 'index.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'file': os.path.basename(self.segment_path),
+                                'start': round(self.segment_start, 3),
+                                'start_sample': self.segment_start_sample,
+                                'samples': samples,
+                                'dropped': self.dropped}) + '\n')
+
+    def _prune(self):
+        # 顺带把同一文件的多行合并成一行
+        index = read_index(self.directory)
+        for item in index[:-self.keep]:
+            path = os.path.join(self.directory, item['file'])
+            if os.path.exists(path): os.remove(path)
+        with open(os.path.join(self.directory, 'index.jsonl'), 'w', encoding='utf-8') as f:
+            for item in index[-self.keep:]:
+                f.write(json.dumps(item) + '\n')
+
+
+def read_index(directory):
+    """按开始时间排列的各段，同一个文件以最后一行为准"""
+    path = os.path.join(directory, 'index.jsonl')
+    if not os.path.exists(path): return []
+    items = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                items[item['file']] = item
+    return sorted(items.values(), key=lambda item: item['start'])
+
+
+def locate(directory, timestamp, samplerate=16000):
+    """按时间戳找到存档文件和文件内的采样偏移，找不到返回 None"""
+    index = read_index(directory)
+    i = bisect_right([item['start'] for item in index], timestamp) - 1
+    if i < 0: return None
+    item = index[i]
+    offset = int((timestamp - item['start']) * samplerate)
+    # samples 为 None：还在写，或者进程没来得及结束这一段
+    if item['samples'] is not None and offset >= item['samples']: return None
+    return os.path.join(directory, item['file']), offset
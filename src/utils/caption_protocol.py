@@ -0,0 +1,216 @@
+import time
+import random
+import struct
+from collections import deque
+
+# 字幕的 UDP 消息格式
+#
+# 原先每次更新都把整行（行缓冲 + 预测）作为纯文本发出去，没有序号、没有虚实之分，
+# 接收端分不清迟到的旧数据报和新的，行越长发的越多。
+# 现在每个数据报是一个 29 字节的定长头加上 utf-8 文字：
+#   magic   b'\xffC'，0xff 不会出现在 utf-8 文本里，据此和旧的纯文本数据报区分
+#   k       b'p' 虚文字、b'f' 实文字、b's' 快照
+#   s       会话 id（识别进程启动时随机生成），换了会话接收端从头开始
+#   n       序号，同一会话内递增；接收端丢弃序号不大于已处理序号的消息
+#   g       段 id（字幕的一行），换段时接收端清空当前行
+#   o       增量的起始位置（字符）：虚文字相对上一条虚文字，实文字相对本段已确认的文字
+#   ts      发送时刻（毫秒时间戳）
+#   age     从采集到发送的毫秒数
+#   plen    快照时末尾虚文字的字节数
+#   文字    从 o 开始替换成的文字；快照时为本段已确认的全部文字加上虚文字
+# 每隔 keyframe 条消息发一次快照代替增量，丢了数据报也能自己恢复。
+# 解码后是 {'k', 's', 'n', 'g', 'o', 't', 'ts', 'age', 'p'} 字典，
+# 不带 magic 的数据报当作旧的纯文本整行，返回字符串，两种发送端都能接收。
+
+magic = b'\xffC'
+header = struct.Struct('<2scIIIHqHH')
+
+
+def encode(message):
+    text = message['t'].encode('utf-8')
+    partial = message.get('p', '').encode('utf-8')
+    return header.pack(magic, message['k'].encode(), message['s'], message['n'], message['g'],
+                       message['o'], message['ts'], min(int(message.get('age', 0)), 65535), len(partial)) + text + partial
+
+
+def decode(data):
+    """返回消息字典；旧的纯文本数据报返回字符串"""
+    data = bytes(data)
+    if not data.startswith(magic) or len(data) < header.size:
+        return data.decode('utf-8')
+    _, kind, session, seq, segment, offset, ts, age, plen = header.unpack_from(data)
+    body = data[header.size:]
+    text, partial = body[:len(body) - plen], body[len(body) - plen:]
+    return {'k': kind.decode(), 's': session, 'n': seq, 'g': segment, 'o': offset, 't': text.decode('utf-8'),
+            'p': partial.decode('utf-8'), 'ts': ts, 'age': age}
+
+
+def _common_prefix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class CaptionEncoder:
+    """发送端：记录本段已确认的文字和当前虚文字，只发变化的部分"""
+
+    def __init__(self, session=None, keyframe=10):
+        self.session = session or random.getrandbits(32)
+        self.keyframe = keyframe
+        self.seq = 0
+        self.segment = 0
+        self.committed = ''
+        self.partial_text = ''
+
+    def _message(self, kind, offset, text, captured):
+        self.seq += 1
+        message = {'s': self.session, 'n': self.seq, 'g': self.segment, 'k': kind, 'o': offset, 't': text,
+                   'ts': int(time.time() * 1000)}
+        if self.seq % self.keyframe == 0:
+            message.update(k='s', o=0, t=self.committed, p=self.partial_text)
+        if captured is not None:
+            message['age'] = (time.perf_counter() - captured) * 1000
+        return encode(message)
+
+    def partial(self, text, captured=None):
+        """虚文字（相对本段已确认文字的预测），没有变化时返回 None"""
+        if text == self.partial_text:
+            return None
+        offset = _common_prefix(self.partial_text, text)
+        self.partial_text = text
+        return self._message('p', offset, text[offset:], captured)
+
+    def final(self, text, captured=None):
+        """实文字，追加到本段已确认的文字后面，虚文字清空"""
+        offset = len(self.committed)
+        self.committed += text
+        self.partial_text = ''
+        return self._message('f', offset, text, captured)
+
+    def new_segment(self):
+        self.segment += 1
+        self.committed = ''
+        self.partial_text = ''
+
+
+class CaptionState:
+    """接收端：按序应用消息，丢弃过期的"""
+
+    def __init__(self):
+        self.session = None
+        self.seq = 0
+        self.segment = None
+        self.committed = ''
+        self.partial = ''
+        self.stale = 0       # 丢弃的过期消息数
+        self.gaps = 0        # 发现序号不连续（丢包）的次数
+
+    @property
+    def text(self):
+        return self.committed + self.partial
+
+    def apply(self, message):
+        """应用一条消息，显示内容可能有变化时返回 True"""
+        if message['s'] != self.session:
+            self.session = message['s']
+            self.seq = 0
+            self.segment = None
+        elif message['n'] <= self.seq:
+            self.stale += 1
+            return False
+        elif message['n'] != self.seq + 1:
+            self.gaps += 1
+        self.seq = message['n']
+
+        if message['g'] != self.segment:
+            self.segment = message['g']
+            self.committed = ''
+            self.partial = ''
+        kind, offset, text = message['k'], message['o'], message['t']
+        if kind == 's':
+            self.committed = text
+            self.partial = message.get('p', '')
+        elif kind == 'f':
+            self.committed = self.committed[:offset] + text
+            self.partial = ''
+        elif kind == 'p':
+            self.partial = self.partial[:offset] + text
+        return True
+
+
+class CaptionLines:
+    """接收端的多行字幕：最近 history 行已完成的文字 + 当前行（已确认的文字和虚文字）"""
+
+    def __init__(self, history=20):
+        self.state = CaptionState()
+        self.lines = deque(maxlen=history)
+        self.plain = ''     # 旧格式的整行纯文本
+
+    @property
+    def current(self):
+        """当前行 (已确认的文字, 虚文字)"""
+        if self.plain and self.state.session is None:
+            return self.plain, ''
+        return self.state.committed, self.state.partial
+
+    def apply(self, message):
+        """应用 decode() 的结果，显示内容可能有变化时返回 True"""
+        if isinstance(message, str):
+            # 旧的纯文本整行没有段号，首字变了就当作换了一行
+            if not message:
+                return False
+            if self.plain and message[:1] != self.plain[:1]:
+                self.lines.append(self.plain)
+            self.plain = message
+            return True
+        state = self.state
+        session, segment, committed = state.session, state.segment, state.committed
+        if not state.apply(message):
+            return False
+        if (state.session != session or state.segment != segment) and committed:
+            self.lines.append(committed)
+        return True
+
+
+def benchmark(messages=20000, line_width=50):
+    """测量编码、解码并应用一条消息的耗时，以及和整行纯文本相比的数据量"""
+    random.seed(0)
+    chars = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经'
+    encoder = CaptionEncoder()
+    payloads, plain = [], 0
+    for _ in range(messages):
+        if len(encoder.committed) >= line_width:
+            encoder.new_segment()
+        if random.random() < 0.7:
+            text = encoder.partial_text + ''.join(random.choices(chars, k=random.randint(1, 3)))
+            payload = encoder.partial(text)
+        else:
+            payload = encoder.final(''.join(random.choices(chars, k=random.randint(4, 10))))
+        if payload:
+            payloads.append(payload)
+            plain += len((encoder.committed + encoder.partial_text).encode('utf-8'))
+
+    start = time.perf_counter()
+    encoder = CaptionEncoder()
+    for _ in range(messages):
+        encoder.partial('今天天气不错我们')
+        encoder.final('今天天气')
+        encoder.new_segment()
+    encode_us = (time.perf_counter() - start) / (2 * messages) * 1e6
+
+    state = CaptionState()
+    start = time.perf_counter()
+    for payload in payloads:
+        state.apply(decode(payload))
+    apply_us = (time.perf_counter() - start) / len(payloads) * 1e6
+
+    size = sum(len(p) for p in payloads) / len(payloads)
+    print(f'{len(payloads)} 条消息  编码 {encode_us:.2f} µs/条  解码并应用 {apply_us:.2f} µs/条')
+    print(f'平均 {size:.1f} 字节/条，整行纯文本平均 {plain / len(payloads):.1f} 字节/条')
+    print(f'接收端 {state.stale} 条过期，{state.gaps} 次丢包')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import subprocess
+
+import numpy as np
+import soundfile
+
+# 一次性切出所有说话人片段
+#
+# 原先每个句子起一个 ffmpeg 进程，每次都要重新打开、解封装、定位源文件，
+# 两小时的会议要起上千个进程。现在：
+#   - 音频：识别前已经解码出整段 16000 采样率的 PCM，直接用 numpy 切片写 wav
+#   - 视频：一批句子只起一个 ffmpeg，用 segment 封装器在所有句子边界处切开（边界处强制关键帧，切点准确），
+#     句子之间的空隙也会切出一段，删掉即可。每批最多 batch 个句子，免得命令行太长
+# clips 为 [(开始毫秒, 结束毫秒, 输出路径), ...]，按时间先后排列、互不重叠
+#
+# 每个说话人的整段音频也从解码好的 PCM 拼：先算出总长度分配好数组再逐段拷贝，线性时间；
+# 原先用 pydub 逐个 + 起来，每次都要拷贝已经拼好的部分，还要把刚写出去的片段再解码一遍
+
+
+def cut_audio(speech, clips, samplerate=16000):
+    """从解码好的整段音频里切出各个片段，写成 16 位 wav"""
+    for start, end, path in clips:
+        data = speech[start * samplerate // 1000: end * samplerate // 1000]
+        soundfile.write(path, data, samplerate, subtype='PCM_16', format='WAV')
+
+
+def _seconds(milliseconds):
+    return f'{milliseconds / 1000:.3f}'
+
+
+def _run(command):
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'ffmpeg 切分失败：{result.stderr.decode(errors="ignore").strip()}')
+
+
+def _cut_video_batch(source, clips, hwaccel, encode):
+    offset = clips[0][0]
+    command = ['ffmpeg', '-nostdin', '-v', 'error', '-y']
+    if hwaccel:
+        command += ['-hwaccel', hwaccel]
+    command += ['-ss', _seconds(offset), '-t', _seconds(clips[-1][1] - offset), '-i', source] + encode
+
+    if len(clips) == 1:
+        _run(command + [clips[0][2]])
+        return
+
+    # 所有句子的起止时间（相对本批开头）就是切点，第 k 段是 [points[k], points[k+1]]
+    points = sorted({t - offset for start, end, _ in clips for t in (start, end)})
+    times = ','.join(_seconds(t) for t in points[1:-1])
+    with tempfile.TemporaryDirectory() as tmp:
+        command += ['-force_key_frames', times, '-f', 'segment', '-segment_times', times,
+                    '-reset_timestamps', '1', os.path.join(tmp, '%05d.mp4')]
+        _run(command)
+        for start, _, path in clips:
+            shutil.move(os.path.join(tmp, f'{points.index(start - offset):05d}.mp4'), path)
+
+
+def cut_video(source, clips, batch=200, hwaccel=None,
+              encode=('-c:v', 'libx264', '-crf', '23', '-c:a', 'aac', '-b:a', '128k')):
+    """从视频里切出各个片段，每批句子一个 ffmpeg 进程"""
+    clips = [clip for clip in clips if clip[1] > clip[0]]
+    for i in range(0, len(clips), batch):
+        _cut_video_batch(source, clips[i:i + batch], hwaccel, list(encode))
+
+
+def gather(speech, segments, samplerate=16000):
+    """把若干 (开始毫秒, 结束毫秒) 片段按顺序拼成一段"""
+    bounds = [(min(start * samplerate // 1000, len(speech)), min(end * samplerate // 1000, len(speech)))
+              for start, end in segments]
+    track = np.empty(sum(max(0, end - start) for start, end in bounds), dtype=speech.dtype)
+    offset = 0
+    for start, end in bounds:
+        if end > start:
+            track[offset:offset + end - start] = speech[start:end]
+            offset += end - start
+    return track
+
+
+def export_mp3(data, path, samplerate=16000, bitrate='128k'):
+    """float32 单声道经 ffmpeg 编码成 mp3，PCM 从管道送进去"""
+    pcm = (np.clip(data, -1, 1) * 32767).astype(np.int16).tobytes()
+    command = ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-f', 's16le', '-ar', str(samplerate), '-ac', '1',
+               '-i', '-', '-b:a', bitrate, path]
+    result = subprocess.run(command, input=pcm, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'ffmpeg 编码 {path} 失败：{result.stderr.decode(errors="ignore").strip()}')
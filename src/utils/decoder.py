@@ -0,0 +1,80 @@
+import subprocess
+import tempfile
+
+import numpy as np
+import soundfile
+
+from utils.file_reader import read_chunks
+
+# 用 ffmpeg 解码音视频，从管道直接读成 numpy
+#
+# 原先先让 ffmpeg 转出一个中间文件（audio/input.mp3）再用 soundfile 读回来，
+# 多一次编码、写盘、解码，转成 mp3 还有编码损失。
+# 这里让 ffmpeg 输出 16000 采样率单声道 s16le 到 stdout：
+#   - decode()：一次读完，返回整段 float32（top/app.py 整段识别用）
+#   - decode_chunks()：边解码边按块产出，第一块解码出来就可以开始识别
+#   - iter_chunks()：已经是 16000 采样率的 wav、flac 直接按块读，不用起 ffmpeg
+
+
+def command(path, samplerate=16000):
+    return ['ffmpeg', '-nostdin', '-v', 'error', '-i', path,
+            '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(samplerate), '-']
+
+
+def decode(path, samplerate=16000):
+    """解码整个文件，返回 float32 单声道"""
+    result = subprocess.run(command(path, samplerate), capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'ffmpeg 解码 {path} 失败：{result.stderr.decode(errors="ignore").strip()}')
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768
+
+
+def decode_chunks(path, chunk_samples, samplerate=16000):
+    """边解码边产出 (float32 块, 是否最后一块)，块是复用缓冲上的视图"""
+    # stderr 写到临时文件，管道写满会卡住 ffmpeg
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command(path, samplerate), stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            raw = np.empty(chunk_samples, dtype=np.int16)
+            view = memoryview(raw).cast('B')
+            buffers = np.empty((2, chunk_samples), dtype=np.float32)
+
+            def fill(buffer):
+                n = 0
+                while n < len(view):
+                    got = process.stdout.readinto(view[n:])
+                    if not got:
+                        break
+                    n += got
+                n //= 2
+                np.multiply(raw[:n], 1 / 32768, out=buffer[:n], casting='unsafe')
+                return buffer[:n]
+
+            current = fill(buffers[0])
+            i = 0
+            while len(current):
+                i ^= 1
+                following = fill(buffers[i])
+                yield current, len(following) == 0
+                current = following
+
+            if process.wait() != 0:
+                stderr.seek(0)
+                raise RuntimeError(f'ffmpeg 解码 {path} 失败：{stderr.read().decode(errors="ignore").strip()}')
+        finally:
+            # 调用方提前停止迭代时结束 ffmpeg
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+
+def iter_chunks(path, chunk_samples, samplerate=16000):
+    """按块产出 (float32 块, 是否最后一块)：采样率相符的文件直接读，否则经 ffmpeg 解码"""
+    try:
+        info = soundfile.info(path)
+    except Exception:
+        info = None
+    if info is not None and info.samplerate == samplerate:
+        return read_chunks(path, chunk_samples, samplerate)
+    return decode_chunks(path, chunk_samples, samplerate)
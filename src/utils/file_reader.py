@@ -0,0 +1,35 @@
+import numpy as np
+import soundfile
+
+# 按块读取音频文件
+#
+# 原先 soundfile.read 把整个文件读成 float64 放进内存再切片，4 小时的录音光读进来就要 1.8 GB。
+# 这里每次只读一个识别窗口（chunk_size[1] * 960 个采样点），直接读成 float32，
+# 只保留两块缓冲：当前块和预读的下一块（用来判断当前块是不是最后一块），
+# 峰值内存和文件长度无关。
+#
+# 产出的块是复用缓冲上的视图，下一次迭代时会被覆盖，需要保留的话自己 copy
+
+
+def read_chunks(path, chunk_samples, samplerate=16000):
+    """按块读取单声道音频，产出 (float32 块, 是否最后一块)；多声道取平均"""
+    with soundfile.SoundFile(path) as f:
+        if f.samplerate != samplerate:
+            raise ValueError(f'{path} 的采样率是 {f.samplerate}，需要 {samplerate}')
+        buffers = np.empty((2, chunk_samples), dtype=np.float32)
+        frames = np.empty((chunk_samples, f.channels), dtype=np.float32) if f.channels > 1 else None
+
+        def fill(buffer):
+            if frames is None:
+                return f.read(dtype='float32', out=buffer)
+            n = len(f.read(dtype='float32', out=frames))
+            np.mean(frames[:n], axis=1, out=buffer[:n])
+            return buffer[:n]
+
+        current = fill(buffers[0])
+        i = 0
+        while len(current):
+            i ^= 1
+            following = fill(buffers[i])
+            yield current, len(following) == 0
+            current = following
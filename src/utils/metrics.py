@@ -0,0 +1,135 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 流式识别各环节的耗时统计，以 Prometheus 文本格式在本机 HTTP 端口上暴露
+#
+# 字幕延迟变大时，要能分清是采集、排队、推理还是发送慢了。
+# 每个片段在写入共享内存时打上时间戳（ShmAudioRing），识别进程取出时记录排队耗时，
+# 推理、UDP 发送各记一次耗时，发送后再记一次从采集到发出的端到端延迟。
+# 每个环节一个直方图（固定桶，observe 只是一次二分查找加两次加法，可以一直开着）。
+# 计数器和队列深度之类的值不在热路径上累加，而是注册成采集函数，抓取时才去读。
+# 端口默认不开，识别脚本顶部设置 metrics_port = 9109 后：
+#
+#   curl http://127.0.0.1:9109/metrics
+
+# 直方图的桶（秒）
+default_buckets = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0)
+
+
+class Histogram:
+
+    def __init__(self, buckets=default_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """按桶估计分位数（取所在桶的上界）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= target:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+
+    def __init__(self, prefix='asr'):
+        self.prefix = prefix
+        self.stages = {}        # 环节 -> Histogram
+        self.collectors = []    # 抓取时调用，返回 {名字: 值}，名字以 _total 结尾的是计数器，其余是仪表
+        self.server = None
+
+    def observe(self, stage, seconds):
+        if stage not in self.stages:
+            self.stages[stage] = Histogram()
+        self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def collect(self, collector):
+        self.collectors.append(collector)
+
+    def values(self):
+        values = {}
+        for collector in self.collectors:
+            values.update(collector())
+        return values
+
+    def render(self):
+        """Prometheus 文本格式"""
+        name = f'{self.prefix}_stage_seconds'
+        lines = [f'# HELP {name} 流式识别各环节耗时', f'# TYPE {name} histogram']
+        for stage, hist in list(self.stages.items()):
+            total = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                total += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {total}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {hist.sum:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+        for key, value in self.values().items():
+            kind = 'counter' if key.endswith('_total') else 'gauge'
+            lines.append(f'# TYPE {self.prefix}_{key} {kind}')
+            lines.append(f'{self.prefix}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def log_line(self):
+        parts = []
+        for stage, hist in list(self.stages.items()):
+            if hist.count:
+                bound = hist.quantile(0.95)
+                p95 = f'≤{bound * 1000:.0f}ms' if bound != float('inf') else f'>{hist.buckets[-1] * 1000:.0f}ms'
+                parts.append(f'{stage} 均值 {hist.sum / hist.count * 1000:.0f}ms p95{p95}')
+        parts += [f'{key} {value}' for key, value in self.values().items()]
+        return '，'.join(parts)
+
+    def serve(self, port, host='127.0.0.1'):
+        """在后台线程里提供 /metrics"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def log_every(self, interval, printer=print):
+        """每 interval 秒打印一行统计"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                printer(f'\033[90m{self.log_line()}\033[0m')
+        threading.Thread(target=loop, daemon=True).start()
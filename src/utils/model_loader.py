@@ -0,0 +1,86 @@
+import sys
+import time
+import importlib
+
+import numpy as np
+
+# 模型的延迟加载
+#
+# 各脚本原先在模块顶层构造 AutoModel。recognize() 跑在 multiprocessing.Process 里，
+# spawn 启动方式（Windows、macOS 默认）下子进程会重新导入主模块，
+# 于是父进程（根本不用模型）和子进程各加载一遍。
+# 现在模型只在识别进程里通过 load_model() 构造，并且在通知主进程“模型加载完成”之前
+# 先用一段假音频跑一次推理预热，记录导入、加载权重、首次推理各花了多少时间。
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），不支持的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def warm_up(model, seconds=1.0, samplerate=16000):
+    # 低电平噪声，免得被 VAD 当成静音整段跳过，首次推理的初始化开销留在这里
+    rng = np.random.default_rng(0)
+    data = (rng.standard_normal(int(seconds * samplerate)) * 0.05).astype(np.float32)
+    model.generate(input=data, cache={})
+
+
+# 可选的推理后端：torch 用 funasr.AutoModel；onnx、onnx-int8 用 ONNX Runtime（CPU），后者加载 int8 量化模型
+backends = ('torch', 'onnx', 'onnx-int8')
+
+
+def load_model(backend='torch', warmup=True, **kwargs):
+    """构造模型，返回 (模型, 各阶段耗时)
+
+    参数与 AutoModel 相同；ncpu 同时作为 ONNX Runtime 的 intra-op 线程数，
+    device='auto' 时有 GPU 就用 cuda，否则用 cpu
+    """
+    if backend not in backends:
+        raise ValueError(f'不支持的推理后端：{backend}，可选 {backends}')
+    timings = {}
+    start = time.perf_counter()
+    if backend == 'torch':
+        from funasr import AutoModel
+        if kwargs.get('device') == 'auto':
+            import torch
+            kwargs['device'] = 'cuda' if torch.cuda.is_available() else 'cpu'
+    else:
+        # 先导入一次，没装时给出明确的提示；导入耗时也算在 import 里
+        try:
+            importlib.import_module('funasr_onnx')
+        except ImportError as e:
+            raise ImportError(f'{backend} 后端需要 funasr_onnx，请 pip install -r requirements.txt：{e}') from e
+        from utils.onnx_backend import OnnxModel
+    timings['import'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if backend == 'torch':
+        model = AutoModel(**kwargs)
+    else:
+        model = OnnxModel(quantize=backend == 'onnx-int8',
+                          intra_op_num_threads=kwargs.pop('ncpu', 4), **kwargs)
+    timings['load'] = time.perf_counter() - start
+
+    if warmup:
+        start = time.perf_counter()
+        warm_up(model)
+        timings['warmup'] = time.perf_counter() - start
+
+    rss = peak_rss_mb()
+    if rss is not None:
+        timings['peak_rss_mb'] = rss
+    return model, timings
+
+
+def format_timings(timings):
+    names = {'import': '导入', 'load': '加载权重', 'warmup': '首次推理'}
+    parts = [f'{names[k]} {v:.2f}s' for k, v in timings.items() if k in names]
+    if 'peak_rss_mb' in timings:
+        parts.append(f'峰值内存 {timings["peak_rss_mb"]} MB')
+    return '，'.join(parts)
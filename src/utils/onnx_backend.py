@@ -0,0 +1,124 @@
+import os
+import re
+import importlib
+
+import numpy as np
+
+# ONNX Runtime 推理后端（CPU）
+#
+# 把 funasr_onnx（>=0.4.1，更早的版本没有 SenseVoiceSmall、SeacoParaformer）的各个模型
+# 包装成和 funasr.AutoModel 一样的 generate() 接口，识别脚本不用关心底层是 PyTorch 还是 ONNX Runtime：
+#   - 流式 paraformer（ParaformerStreaming）：带 cache 逐块推理
+#   - SenseVoiceSmall、离线 paraformer（含 SeACo、Contextual）：可选先用 FSMN-VAD 切段，逐段识别后拼接
+#   - 可选用 CT-Transformer 加标点
+# 用哪个类按模型目录里 config.yaml 的 model 字段决定，没有 config.yaml 时按目录名猜；
+# 不支持的模型直接报错，请改用 backend = 'torch'。
+# quantize=True 时加载 model_quant.onnx（int8 量化），模型目录里没有 onnx 文件时
+# funasr_onnx 会在首次加载时用 funasr.AutoModel(...).export() 导出（需要装有 funasr 1.x 和 torch）。
+
+# SenseVoice 输出里的语种、情感、事件标签，例如 <|zh|><|NEUTRAL|><|Speech|>
+rich_tag = re.compile(r'<\|[^|]*\|>')
+
+
+def _text(pred):
+    # 不同版本的 funasr_onnx 返回 {'preds': 文本} 或 {'preds': (文本, token 列表)}
+    if isinstance(pred, dict):
+        pred = pred.get('preds', pred.get('text', ''))
+    if isinstance(pred, (tuple, list)):
+        pred = pred[0] if pred else ''
+    return rich_tag.sub('', pred or '')
+
+
+# config.yaml 里的模型类型 -> funasr_onnx 里的类
+model_classes = {
+    'ParaformerStreaming': ('funasr_onnx.paraformer_online_bin', 'Paraformer'),
+    'Paraformer': ('funasr_onnx', 'Paraformer'),
+    'BiCifParaformer': ('funasr_onnx', 'Paraformer'),
+    'ContextualParaformer': ('funasr_onnx', 'ContextualParaformer'),
+    'SeacoParaformer': ('funasr_onnx', 'SeacoParaformer'),
+    'SenseVoiceSmall': ('funasr_onnx', 'SenseVoiceSmall'),
+}
+
+
+def model_type(model):
+    """读模型目录里 config.yaml 的 model 字段，没有时按目录名猜"""
+    config = os.path.join(model, 'config.yaml')
+    if os.path.exists(config):
+        with open(config, encoding='utf-8') as f:
+            for line in f:
+                if match := re.match(r'model:\s*(\w+)', line):
+                    return match.group(1)
+    name = model.lower()
+    if 'online' in name: return 'ParaformerStreaming'
+    if 'sensevoice' in name: return 'SenseVoiceSmall'
+    if 'seaco' in name: return 'SeacoParaformer'
+    if 'contextual' in name: return 'ContextualParaformer'
+    if 'paraformer' in name: return 'Paraformer'
+    return None
+
+
+def load_class(module, name):
+    try:
+        return getattr(importlib.import_module(module), name)
+    except (ImportError, AttributeError):
+        from importlib.metadata import version
+        raise ImportError(f'funasr_onnx {version("funasr_onnx")} 里没有 {name}，'
+                          f'请安装 requirements.txt 里的版本（funasr_onnx>=0.4.1）') from None
+
+
+class OnnxModel:
+
+    def __init__(self, model, vad_model=None, punc_model=None, quantize=False,
+                 intra_op_num_threads=4, chunk_size=(5, 10, 5), hotwords='', **kwargs):
+        options = dict(quantize=quantize, intra_op_num_threads=intra_op_num_threads)
+        kind = model_type(model)
+        if kind not in model_classes:
+            raise ValueError(f'ONNX 后端不支持这个模型（{kind or "未知类型"}）：{model}，'
+                             f'支持 {", ".join(model_classes)}，其他模型请用 backend = \'torch\'')
+        self.streaming = kind == 'ParaformerStreaming'
+        self.sense_voice = kind == 'SenseVoiceSmall'
+        # SeACo、Contextual paraformer 的 onnx 模型多一个热词输入（bias_embed），没有热词时传空串
+        self.hotwords = hotwords if kind in ('SeacoParaformer', 'ContextualParaformer') else None
+
+        asr_class = load_class(*model_classes[kind])
+        if self.streaming:
+            self.asr = asr_class(model, batch_size=1, chunk_size=list(chunk_size), **options)
+        else:
+            self.asr = asr_class(model, batch_size=1, **options)
+
+        self.vad = None
+        if vad_model and not self.streaming:
+            self.vad = load_class('funasr_onnx', 'Fsmn_vad')(vad_model, **options)
+
+        self.punc = None
+        if punc_model:
+            self.punc = load_class('funasr_onnx', 'CT_Transformer')(punc_model, **options)
+
+    def _recognize(self, data):
+        if self.sense_voice:
+            return ''.join(_text(r) for r in self.asr(data, language='auto', textnorm='withitn'))
+        if self.hotwords is not None:
+            return ''.join(_text(r) for r in self.asr(data, self.hotwords))
+        return ''.join(_text(r) for r in self.asr(data))
+
+    def generate(self, input, cache=None, is_final=False, **kwargs):
+        if isinstance(input, list):
+            # 多路音频：逐个识别，每路一个结果，与 AutoModel 的批量输入一致
+            return [self.generate(data, cache, is_final)[0] for data in input]
+        data = np.asarray(input, dtype=np.float32)
+
+        if self.streaming:
+            param_dict = {'cache': {} if cache is None else cache, 'is_final': is_final}
+            text = ''.join(_text(r) for r in self.asr(audio_in=data, param_dict=param_dict))
+        elif self.vad is not None:
+            # VAD 返回以毫秒计的 [[开始, 结束], ...]
+            segments = self.vad(data)
+            if segments and isinstance(segments[0], list) and segments[0] and isinstance(segments[0][0], list):
+                segments = segments[0]
+            text = ''.join(self._recognize(data[beg * 16:end * 16]) for beg, end in segments if end > beg)
+        else:
+            text = self._recognize(data)
+
+        if text and self.punc is not None:
+            text = self.punc(text)[0]
+        return [{'text': text}]
@@ -0,0 +1,72 @@
+import queue
+import threading
+
+# 多阶段流水线
+#
+# 每个阶段若干个工作线程，阶段之间用有界队列连接：
+# 下游处理不过来时上游会阻塞，在途的数据量（比如解码好的整段 PCM）有上限。
+# 各阶段同时运行，一批文件的总耗时取决于最慢的阶段，而不是各阶段耗时之和。
+#
+# stages 为 [(名字, 函数, 并发数), ...]，函数接收上一阶段的输出，返回值交给下一阶段，
+# 返回 None 表示这一项到此为止（比如没有识别结果）。
+# 每一项在每个阶段开始、完成、出错时调用 on_event(序号, 阶段名, 状态, 信息)，
+# 状态为 'start'、'done'、'skip'、'error'；出错的项不再往下传，不影响其他项。
+
+_stop = object()
+
+
+class Pipeline:
+
+    def __init__(self, stages, maxsize=2, on_event=None):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize) for _ in stages]
+        self.on_event = on_event or (lambda *args: None)
+        self.results = []
+        self.lock = threading.Lock()
+
+    def _worker(self, i, remaining):
+        name, func, _ = self.stages[i]
+        while True:
+            item = self.queues[i].get()
+            if item is _stop:
+                break
+            index, data = item
+            self.on_event(index, name, 'start', None)
+            try:
+                data = func(data)
+            except Exception as e:
+                self.on_event(index, name, 'error', e)
+                continue
+            if data is None:
+                self.on_event(index, name, 'skip', None)
+                continue
+            self.on_event(index, name, 'done', None)
+            if i + 1 < len(self.stages):
+                self.queues[i + 1].put((index, data))
+            else:
+                with self.lock:
+                    self.results.append((index, data))
+
+        # 本阶段最后一个退出的线程通知下一阶段结束
+        with self.lock:
+            remaining[i] -= 1
+            last = remaining[i] == 0
+        if last and i + 1 < len(self.stages):
+            for _ in range(self.stages[i + 1][2]):
+                self.queues[i + 1].put(_stop)
+
+    def run(self, items):
+        """处理所有项，阻塞到全部完成，按输入顺序返回 [(序号, 最后一阶段的输出)]"""
+        self.results = []
+        remaining = [workers for _, _, workers in self.stages]
+        threads = [threading.Thread(target=self._worker, args=(i, remaining), daemon=True)
+                   for i, (_, _, workers) in enumerate(self.stages) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for index, item in enumerate(items):
+            self.queues[0].put((index, item))
+        for _ in range(self.stages[0][2]):
+            self.queues[0].put(_stop)
+        for thread in threads:
+            thread.join()
+        return sorted(self.results, key=lambda result: result[0])
@@ -0,0 +1,83 @@
+import time
+from multiprocessing import Process, Queue
+
+import numpy as np
+
+from utils.shm_ring import ShmAudioRing
+
+# 用音频文件代替麦克风，按实时（或加速）的节奏把片段写进 ShmAudioRing
+#
+# speed=1 和麦克风一样每 60ms 写一个片段，speed=2 快一倍；
+# speed=0 不按时间节奏，只在识别进程积压超过半个缓冲时等一等，尽快喂完且不丢片段。
+# 返回每个成功写入的片段的写入时刻（time.perf_counter），
+# 识别端收到的第 k 个片段就是第 k 次写入，据此计算延迟
+#
+# ends 是要在哪些片段之前发 {'type': 'end'}（片段序号，相当于录音时按回车），超出音频长度的在最后补发。
+# 给了 resampler 时 speech 是设备采样率的音频，按 resampler.blocksize 切块、重采样后再写入，
+# 和 record_callback 走同一条路径
+
+
+def replay(ring, speech, speed=1.0, frame=960, samplerate=16000, ends=(), resampler=None):
+    if resampler is not None:
+        frame, samplerate = resampler.blocksize, resampler.in_rate
+    count = -(-len(speech) // frame)
+    times = np.empty(count)
+    block = np.zeros(frame, dtype=np.float32)
+    period = frame / samplerate / speed if speed > 0 else 0
+    ends = sorted(ends)
+    written = 0
+    start = time.perf_counter()
+    for i in range(count):
+        while ends and ends[0] <= i:
+            ring.put({'type': 'end'})
+            ends.pop(0)
+        data = speech[i * frame:(i + 1) * frame]
+        if len(data) < frame:
+            block[:] = 0
+            block[:len(data)] = data
+            data = block
+        if resampler is not None:
+            data = resampler.process(data)
+        if period:
+            wait = start + i * period - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        else:
+            while ring.qsize() >= ring.capacity // 2:
+                time.sleep(0.001)
+        now = time.perf_counter()
+        if ring.write(data):
+            times[written] = now
+            written += 1
+    for _ in ends:
+        ring.put({'type': 'end'})
+    return times[:written]
+
+
+def session(recognize, speech, speed=1.0, ends=(), resampler=None, **kwargs):
+    """在子进程里运行 recognize(events=True)，回放一段音频，最后再发一次 'end'
+
+    返回 (写入时刻, 事件列表, 丢弃的片段数)。每次 'end' 处理完后事件列表里有一条 'stats'，
+    kwargs 原样传给 recognize（load、chunk_size、pre_expect 等）
+    """
+    queue_in = ShmAudioRing()
+    queue_out = Queue()
+    process = Process(target=recognize, args=[queue_in, queue_out], daemon=True,
+                      kwargs=dict(events=True, echo=False, metrics_port=None, **kwargs))
+    process.start()
+    try:
+        queue_out.get()   # 等模型加载完
+        writes = replay(queue_in, speech, speed, ends=ends, resampler=resampler)
+        queue_in.put({'type': 'end'})
+        events, remaining = [], len(ends) + 1
+        while remaining:
+            events.append(event := queue_out.get())
+            remaining -= event['type'] == 'stats'
+        queue_in.put({'type': 'stop'})
+        process.join(timeout=10)
+        dropped = queue_in.dropped
+    finally:
+        if process.is_alive():
+            process.terminate()
+        queue_in.close()
+    return writes, events, dropped
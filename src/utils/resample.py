@@ -0,0 +1,127 @@
+import time
+from math import gcd, ceil
+
+import numpy as np
+
+# 采集回调里用的重采样：任意输入采样率（44.1k、48k、96k……）转成 16000
+#
+# 原先是 np.mean(indata.copy()[::3], axis=1)，每个块都复制一份，
+# 而且直接隔三取一、没有低通滤波，8kHz 以上的成分会混叠回模型听得到的频带。
+# 这里用多相 FIR：
+#   - 低通滤波器是 Kaiser 窗 sinc，截止频率为输出奈奎斯特频率的 rolloff 倍
+#   - 块长是 down 的整数倍，所以每个块里各输出采样对应的相位、抽头位置都一样，
+#     可以预先算好抽头下标和系数矩阵
+#   - 滤波器状态（上一块末尾的采样）跨块保存，块与块之间连续
+#   - 所有缓冲都预先分配，稳态下每次调用不分配内存
+
+
+class Resampler:
+
+    def __init__(self, in_rate, out_rate=16000, channels=1, blocksize=None,
+                 zeros=16, rolloff=0.9, beta=8.0):
+        g = gcd(int(in_rate), int(out_rate))
+        self.up = int(out_rate) // g
+        self.down = int(in_rate) // g
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.channels = channels
+
+        # 默认块长 60ms，对应 16000 采样率下的 960 个采样
+        if blocksize is None:
+            blocksize = self.in_rate * 60 // 1000
+        if blocksize % self.down:
+            raise ValueError(f'块长 {blocksize} 必须是 {self.down} 的整数倍')
+        self.blocksize = blocksize
+        self.out_size = blocksize * self.up // self.down
+
+        # 截止频率（单位：每个输入采样的周期数）和滤波器半宽（单位：输入采样）
+        fc = rolloff * min(1.0, self.up / self.down) / 2
+        half_width = zeros / (2 * fc)
+        w = ceil(half_width)
+        self.history = 2 * w  # 需要保留的历史采样数，同时也是 w 个采样的延迟
+
+        # 第 n 个输出采样对应的输入位置（相对块首，减去延迟 w）
+        n = np.arange(self.out_size)
+        center = n * self.down / self.up - w
+        first = np.floor(center).astype(np.int64) - w + 1
+        taps = first[:, None] + np.arange(2 * w)[None, :]   # 每个输出采样用到的输入下标
+        tau = center[:, None] - taps
+        window = np.i0(beta * np.sqrt(np.clip(1 - (tau / half_width) ** 2, 0, None))) / np.i0(beta)
+        coef = 2 * fc * np.sinc(2 * fc * tau) * window
+        coef[np.abs(tau) >= half_width] = 0
+        coef /= coef.sum(axis=1, keepdims=True)  # 直流增益为 1
+
+        self.index = (taps + self.history).astype(np.intp)
+        self.coef = coef.astype(np.float32)
+
+        # 预先分配的缓冲：历史 + 当前块，抽头展开后的矩阵，输出
+        self.buffer = np.zeros(self.history + blocksize, dtype=np.float32)
+        self.gathered = np.empty(self.coef.shape, dtype=np.float32)
+        self.out = np.empty(self.out_size, dtype=np.float32)
+        self.scale = np.float32(1 / channels)
+
+    def reset(self):
+        self.buffer[:] = 0
+
+    def process(self, indata):
+        """输入 (blocksize, channels) 的 float32 块，返回重采样后的单声道数据
+
+        返回的是内部缓冲的视图，下次调用时会被覆盖，需要保留的话请自行复制
+        """
+        if indata.shape[0] != self.blocksize:
+            raise ValueError(f'块长应为 {self.blocksize}，实际为 {indata.shape[0]}')
+        block = self.buffer[self.history:]
+
+        # 混成单声道，直接写进缓冲
+        if indata.ndim == 1:
+            block[:] = indata
+        else:
+            np.sum(indata, axis=1, out=block)
+            if indata.shape[1] > 1:
+                np.multiply(block, self.scale, out=block)
+
+        # 多相 FIR：取出抽头、乘系数、按行求和
+        # mode='clip' 时 np.take 不会为 out 额外分配临时缓冲（下标都在范围内）
+        np.take(self.buffer, self.index, out=self.gathered, mode='clip')
+        np.multiply(self.gathered, self.coef, out=self.gathered)
+        np.sum(self.gathered, axis=1, out=self.out)
+
+        # 保留末尾的采样作为下一块的滤波器状态
+        self.buffer[:self.history] = self.buffer[-self.history:]
+        return self.out
+
+
+def benchmark(rates=(44100, 48000, 96000), channels=(1, 2), calls=2000):
+    """测量每次回调的耗时和稳态内存分配"""
+    import tracemalloc
+
+    budget = 60.0
+    for rate in rates:
+        for ch in channels:
+            resampler = Resampler(rate, channels=ch)
+            indata = np.random.default_rng(0).standard_normal((resampler.blocksize, ch)).astype(np.float32)
+            for _ in range(50): resampler.process(indata)   # 预热
+
+            times = np.empty(calls)
+            for i in range(calls):
+                t = time.perf_counter()
+                resampler.process(indata)
+                times[i] = time.perf_counter() - t
+
+            tracemalloc.start()
+            for _ in range(50): resampler.process(indata)
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            for _ in range(calls): resampler.process(indata)
+            after, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            times *= 1000
+            print(f'{rate:>6} Hz {ch} 声道  抽头 {resampler.coef.shape[1]:>3}  '
+                  f'平均 {times.mean():.3f} ms  p99 {np.percentile(times, 99):.3f} ms  '
+                  f'预算占比 {np.percentile(times, 99) / budget:.2%}  '
+                  f'稳态分配 {after - before} B（峰值 {peak - before} B）')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,86 @@
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+
+# 识别结果的磁盘缓存
+#
+# 同一个文件重新处理时（只改了分离字数、换了保存目录，或者上次中途退出），
+# 不用再跑一遍 VAD + 识别 + 标点 + 说话人分离。
+# 键是解码后 PCM 的 sha256，加上模型路径、版本和 generate 参数，任何一项变了都不会命中。
+# 只保存文字和每句的起止时间、说话人，gzip 压缩的 json，一个结果一个文件。
+# 目录总大小超过 max_bytes 时按最近使用时间（读取时会更新文件的修改时间）淘汰最旧的。
+
+
+def to_builtin(value):
+    """json.dumps 的 default：模型输出里的 numpy 标量、数组（比如 spk 是 np.int64）转成 Python 类型"""
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class ResultCache:
+
+    def __init__(self, directory='cache/asr', max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(speech, **params):
+        digest = hashlib.sha256(np.ascontiguousarray(speech).data)
+        digest.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json.gz')
+
+    def get(self, key):
+        """命中返回 {'text', 'sentence_info'}，否则返回 None"""
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return result
+
+    def put(self, key, rec_result):
+        result = {'text': rec_result['text'],
+                  'sentence_info': [{k: sentence[k] for k in ('start', 'end', 'text', 'spk') if k in sentence}
+                                    for sentence in rec_result.get('sentence_info', [])]}
+        # 先序列化，失败时不会创建文件
+        data = json.dumps(result, ensure_ascii=False, separators=(',', ':'), default=to_builtin).encode('utf-8')
+        # 先写临时文件再改名，中途退出不会留下半个缓存文件；写失败（磁盘满等）时删掉临时文件
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json.gz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,88 @@
+import numpy as np
+
+# 流式识别用的音频缓冲，代替 chunks = [] 列表
+#
+# 原先每次预测、每次解码都要 np.concatenate(chunks) 新建一个数组，然后 chunks.clear()，
+# 长时间运行时分配器和 GC 压力都很大。这里预先分配一块固定容量的 float32 数组：
+#   - 新片段直接拷进数组尾部
+#   - 当前窗口、左回看、右回看都是这块数组上的连续视图，不需要拼接
+#   - 窗口解码完只移动起点；尾部空间不够时才把左回看和未解码的部分挪到数组开头，
+#     每解码完一个窗口最多挪一次
+#
+# 布局：
+#   |...已丢弃...|  左回看  |       当前窗口        |   空闲   |
+#                ^          ^          ^          ^
+#          start-left     start    end-right     end
+
+
+class AudioRingBuffer:
+
+    def __init__(self, chunk_size, frame=960, capacity_frames=None):
+        self.frame = frame
+        self.left = chunk_size[0] * frame
+        self.total = chunk_size[1] * frame
+        self.right = chunk_size[2] * frame
+        # 默认容量：左回看 + 两个窗口，这样每两个窗口才需要挪一次
+        if capacity_frames is None:
+            capacity_frames = chunk_size[0] + 2 * chunk_size[1]
+        self.data = np.zeros(capacity_frames * frame, dtype=np.float32)
+        self.start = 0
+        self.end = 0
+        self.compactions = 0
+
+    @property
+    def frames(self):
+        """当前窗口里的片段数"""
+        return (self.end - self.start) // self.frame
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def free(self):
+        """挪一次之后最多还能追加的采样数（append 超过它会抛 BufferError）"""
+        return len(self.data) - (self.end - max(0, self.start - self.left))
+
+    def append(self, samples):
+        n = len(samples)
+        if self.end + n > len(self.data):
+            self.compact()
+            if self.end + n > len(self.data):
+                raise BufferError(f'音频缓冲已满（容量 {len(self.data)} 个采样）')
+        self.data[self.end:self.end + n] = samples
+        self.end += n
+
+    def window(self):
+        """当前窗口（尚未解码的部分）"""
+        return self.data[self.start:self.end]
+
+    def lookback(self):
+        """窗口之前的左回看区域"""
+        return self.data[max(0, self.start - self.left):self.start]
+
+    def lookahead(self):
+        """窗口末尾的右回看区域"""
+        return self.data[max(self.start, self.end - self.right):self.end]
+
+    def advance(self, samples=None):
+        """窗口（或窗口前 samples 个采样）已解码，并入回看区域"""
+        if samples is None:
+            samples = self.end - self.start
+        self.start += min(samples, self.end - self.start)
+        # 剩余空间放不下下一个窗口时，趁现在挪一次
+        if self.end + self.total > len(self.data):
+            self.compact()
+
+    def compact(self):
+        keep_from = max(0, self.start - self.left)
+        if keep_from == 0:
+            return
+        kept = self.end - keep_from
+        self.data[:kept] = self.data[keep_from:self.end]
+        self.start -= keep_from
+        self.end = kept
+        self.compactions += 1
+
+    def reset(self):
+        self.start = 0
+        self.end = 0
@@ -0,0 +1,97 @@
+import time
+from contextlib import contextmanager
+
+# 虚文字（预测）的调度
+#
+# 原先用固定的 pre_expect（5 或 10 个片段）加上 queue_in.qsize() < 3 来决定何时预测：
+# 慢机器上预测挤占实文字的时间，快机器上又预测得不够勤。
+# 这里测量每次 model.generate 的耗时（指数滑动平均），结合输入积压来动态决定预测间隔：
+#   - 实时约束：一个窗口（chunk_size[1] 个片段）的音频时长内，
+#     实文字解码加上若干次预测的总耗时不能超过 utilization 倍的窗口时长，
+#     间隔取预算允许的最小值（推理越快预测越勤），最长为一个窗口
+#   - 延迟目标：片段到达后最多等 cadence 个片段再花 preview_time 解码，
+#     cadence * 片段时长 + preview_time 应不超过 target_latency；
+#     预算做不到时不牺牲实时，只在 stats 里记 latency_ok = False
+#   - 积压超过 max_lag 个片段时跳过预测，先追上实时
+
+
+class PreviewScheduler:
+
+    def __init__(self, chunk_size, cadence=5, target_latency=0.3, frame_seconds=0.06,
+                 utilization=0.8, max_lag=3, adaptive=True, smoothing=0.2):
+        self.window = chunk_size[1]
+        self.cadence = cadence
+        self.target_latency = target_latency
+        self.frame_seconds = frame_seconds
+        self.utilization = utilization
+        self.max_lag = max_lag
+        self.adaptive = adaptive
+        self.smoothing = smoothing
+        self.preview_time = None   # 预测耗时的滑动平均（秒）
+        self.final_time = None     # 实文字耗时的滑动平均（秒）
+        self.since = 0             # 距上次预测（或窗口开始）已到达的片段数
+        self.busy = 0.0            # 推理总耗时（秒），用于计算实时率
+        self.counters = {'frames': 0, 'previews': 0, 'finals': 0,
+                         'skipped_lag': 0, 'skipped_window': 0, 'cadence': cadence, 'latency_ok': True}
+
+    def should_preview(self, frames, lag):
+        """每到达一个片段调用一次。frames 为当前窗口的片段数，lag 为积压的片段数"""
+        self.counters['frames'] += 1
+        self.since += 1
+        if self.since < self.cadence:
+            return False
+        if frames >= self.window:
+            # 窗口已满，马上就要解码实文字，预测没有意义
+            self.counters['skipped_window'] += 1
+            return False
+        if lag > self.max_lag:
+            self.counters['skipped_lag'] += 1
+            self.since = 0
+            return False
+        self.since = 0
+        return True
+
+    @contextmanager
+    def timed(self, kind):
+        """包住一次 model.generate，kind 为 'preview' 或 'final'"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.busy += elapsed
+            if kind == 'preview':
+                self.preview_time = self._average(self.preview_time, elapsed)
+                self.counters['previews'] += 1
+            else:
+                self.final_time = self._average(self.final_time, elapsed)
+                self.counters['finals'] += 1
+                self.since = 0
+            if self.adaptive:
+                self._update_cadence()
+
+    def _average(self, old, new):
+        return new if old is None else old + self.smoothing * (new - old)
+
+    def _update_cadence(self):
+        if self.preview_time is None:
+            return
+        window_seconds = self.window * self.frame_seconds
+
+        # 实时约束要求的最小间隔：每个窗口最多能做几次预测
+        budget = window_seconds * self.utilization - (self.final_time or 0)
+        max_previews = int(budget / self.preview_time) if budget > 0 else 0
+        budget_cadence = self.window if max_previews <= 0 else -(-self.window // max_previews)
+        self.cadence = min(self.window, max(1, budget_cadence))
+
+        # 延迟目标允许的最大间隔，只用来报告预算是否够用
+        latency_cadence = int((self.target_latency - self.preview_time) / self.frame_seconds)
+        self.counters['cadence'] = self.cadence
+        self.counters['latency_ok'] = self.cadence <= latency_cadence
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['busy_s'] = round(self.busy, 3)
+        if self.preview_time is not None: stats['preview_ms'] = round(self.preview_time * 1000, 1)
+        if self.final_time is not None: stats['final_ms'] = round(self.final_time * 1000, 1)
+        return stats
@@ -0,0 +1,130 @@
+from multiprocessing import Queue, Semaphore
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+import time
+
+import numpy as np
+
+# 采集进程 -> 识别进程的音频通道，基于共享内存，代替 multiprocessing.Queue
+#
+# 原先每 60ms 要把 {'type': 'feed', 'samples': ndarray} pickle 一次塞进队列，
+# 识别进程再 unpickle，序列化、管道系统调用、后台 feeder 线程一样不少，
+# 而且只能用 queue_in.qsize() 粗略判断积压。
+#
+# 这里是单生产者单消费者的环形缓冲：
+#   - 共享内存开头是三个 int64：写游标、读游标、丢弃的片段数（单位都是片段）
+#   - 接着是每个槽位的写入时刻（float64，time.perf_counter），用来统计排队和端到端延迟
+#   - 后面是 capacity 个槽位，每个槽位放一个片段（960 个 float32 采样），
+#     片段不会跨越环形缓冲的边界，所以消费者总能拿到连续的视图，不需要复制
+#   - 生产者只写写游标，消费者只写读游标；先写数据再推进写游标
+#   - 缓冲满了生产者直接丢弃并计数，音频回调永远不阻塞、不分配内存
+#   - 'end' 之类的控制消息走一个小队列，消息里带着发送时的写游标，
+#     消费者读到这个位置才处理它，保证和音频的先后顺序一致
+#
+# 对外的接口和原来的队列一致：put() 发控制消息，get() 取指令，qsize() 返回积压的片段数
+
+
+class ShmAudioRing:
+
+    def __init__(self, frame=960, capacity=256):
+        self.frame = frame
+        self.capacity = capacity
+        self.shm = SharedMemory(create=True, size=8 * 3 + 8 * capacity + 4 * frame * capacity)
+        self.owner = True
+        self.control = Queue()
+        self.doorbell = Semaphore(0)   # 生产者每写一个片段敲一下，消费者空闲时在这里等
+        self._attach()
+        self.cursors[:] = 0
+
+    def _attach(self):
+        self.cursors = np.ndarray((3,), dtype=np.int64, buffer=self.shm.buf)
+        self.times = np.ndarray((self.capacity,), dtype=np.float64, buffer=self.shm.buf, offset=8 * 3)
+        self.data = np.ndarray((self.capacity, self.frame), dtype=np.float32, buffer=self.shm.buf,
+                               offset=8 * 3 + 8 * self.capacity)
+        self.slots = list(self.data)     # 预先切好每个槽位的视图，写入时不再创建对象
+        self.pending = None              # 已取出、位置还没到的控制消息
+        self.holding = False             # 消费者是否还占着上一个片段
+
+    def __getstate__(self):
+        return {'name': self.shm.name, 'frame': self.frame, 'capacity': self.capacity,
+                'control': self.control, 'doorbell': self.doorbell}
+
+    def __setstate__(self, state):
+        self.frame = state['frame']
+        self.capacity = state['capacity']
+        self.control = state['control']
+        self.doorbell = state['doorbell']
+        self.owner = False
+        # 子进程和创建者共用同一个 resource_tracker，由创建者负责释放
+        try:
+            self.shm = SharedMemory(name=state['name'], track=False)
+        except TypeError:   # Python 3.13 之前没有 track 参数
+            self.shm = SharedMemory(name=state['name'])
+        self._attach()
+
+    # ---------------- 生产者（音频回调） ----------------
+
+    def write(self, samples, timestamp=None):
+        """写入一个片段，缓冲满时丢弃并返回 False，不阻塞。timestamp 默认为当前 perf_counter"""
+        w = int(self.cursors[0])
+        if w - int(self.cursors[1]) >= self.capacity:
+            self.cursors[2] += 1
+            return False
+        np.copyto(self.slots[w % self.capacity], samples)
+        self.times[w % self.capacity] = time.perf_counter() if timestamp is None else timestamp
+        self.cursors[0] = w + 1
+        self.doorbell.release()
+        return True
+
+    def put(self, message):
+        """发送控制消息，例如 {'type': 'end'}"""
+        self.control.put((int(self.cursors[0]), message))
+
+    # ---------------- 消费者（识别进程） ----------------
+
+    def get(self, timeout=None):
+        """取下一条指令：{'type': 'feed', 'samples': 视图, 'time': 写入时刻} 或控制消息
+
+        samples 是共享内存上的视图，下次调用 get() 之前有效
+        """
+        if self.holding:
+            self.cursors[1] += 1
+            self.holding = False
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            r = int(self.cursors[1])
+            if self.pending is None:
+                try: self.pending = self.control.get_nowait()
+                except Empty: pass
+            if self.pending is not None and self.pending[0] <= r:
+                message, self.pending = self.pending[1], None
+                return message
+            if int(self.cursors[0]) > r:
+                self.holding = True
+                return {'type': 'feed', 'samples': self.slots[r % self.capacity],
+                        'time': float(self.times[r % self.capacity])}
+
+            wait = 0.05 if deadline is None else min(0.05, deadline - time.monotonic())
+            if wait <= 0:
+                raise Empty
+            # 控制消息不会敲门铃，所以等待时间不宜过长
+            self.doorbell.acquire(timeout=wait)
+
+    def qsize(self):
+        """积压的片段数（不含消费者手上正在处理的片段）"""
+        return int(self.cursors[0]) - int(self.cursors[1]) - self.holding
+
+    def lag(self):
+        """积压的采样数"""
+        return self.qsize() * self.frame
+
+    @property
+    def dropped(self):
+        return int(self.cursors[2])
+
+    def close(self):
+        del self.cursors, self.times, self.data, self.slots
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
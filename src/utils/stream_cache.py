@@ -0,0 +1,82 @@
+import os
+import string
+
+# 预测虚文字的两种方式，按模型是不是流式模型选择（is_streaming）
+#
+# 非流式模型（SeACo-Paraformer、SenseVoiceSmall，AutoModel 里还带着 VAD 和标点模型）不使用 cache。
+# 原先每次预测都把整个窗口解码一遍，窗口越长越慢（SenseVoice 的窗口 3 秒）。
+# 这里每次只解码上次预测之后新到的片段，前面带上 context 个采样（默认 10 个片段，0.6 秒）的左语境，
+# 单次预测的耗时只和预测间隔有关；解出的文字开头和上次的虚文字结尾重叠的部分去掉后接上
+# （比较时忽略上次结尾的标点，那是在切口处加的）。重叠对不上时直接拼接，虚文字可能多一两个字，
+# 窗口凑满后的实文字仍然是整个窗口解码的结果，不受影响。
+#
+# 流式模型（paraformer online）的缓存（param_dict['cache']）是多层嵌套的字典和列表，叶子是张量或数组。
+# 原先要 deepcopy 整个缓存再从头解码整个窗口，这里改为写时复制：只复制字典、列表这些骨架，叶子上的张量共享。
+# 这依赖于模型推理时给缓存的键重新赋值、而不原地修改张量，只有流式模型才走这条路；
+# 换了模型或 funasr 版本，请先用 replay_streaming.py --compare 确认实文字不受预测影响。
+# 预测分支在窗口内一直往前走，每次只解码新到的片段；
+# 窗口凑满、解出实文字后，直接丢弃预测分支（回滚），下个窗口再从正式缓存分叉。
+
+
+def is_streaming(model_path):
+    """按模型路径判断是不是流式模型（modelscope 上流式 paraformer 的名字都带 online）"""
+    return 'online' in os.path.normpath(str(model_path)).lower()
+
+
+punctuation = set(string.punctuation + string.whitespace + '，。！？、；：…')
+
+
+def merge_text(text, piece):
+    """把带左语境解码出的 piece 接到 text 后面，去掉两者重叠的部分"""
+    end = len(text)
+    while end and text[end - 1] in punctuation:
+        end -= 1
+    for k in range(min(end, len(piece)), 0, -1):
+        if text[end - k:end] == piece[:k]:
+            return text[:end] + piece[k:]
+    return text + piece
+
+
+def fork_cache(cache):
+    """复制缓存的骨架，叶子共享"""
+    if isinstance(cache, dict):
+        return {k: fork_cache(v) for k, v in cache.items()}
+    if isinstance(cache, list):
+        return [fork_cache(v) for v in cache]
+    return cache
+
+
+class PreviewDecoder:
+    """预测虚文字：只解码上次预测之后新到的片段，流式模型接着预测分支的缓存，非流式模型带上左语境"""
+
+    def __init__(self, model, streaming=False, context=10 * 960):
+        self.model = model
+        self.streaming = streaming
+        self.context = context
+        self.rollback()
+
+    def rollback(self):
+        # 丢弃预测分支，下次预测时从正式缓存重新分叉
+        self.cache = None
+        self.consumed = 0
+        self.text = ''
+
+    def decode(self, window, cache):
+        # window 为当前窗口的音频，cache 为正式缓存
+        if len(window) <= self.consumed:
+            return self.text
+        if not self.streaming:
+            piece = window[max(0, self.consumed - self.context):]
+            self.consumed = len(window)
+            rec_result = self.model.generate(input=piece, cache={})
+            if rec_result and rec_result[0].get('text'):
+                self.text = merge_text(self.text, rec_result[0]['text'])
+            return self.text
+        if self.cache is None:
+            self.cache = fork_cache(cache)
+        new = window[self.consumed:]
+        self.consumed = len(window)
+        rec_result = self.model.generate(input=new, cache=self.cache, is_final=False)
+        if rec_result and rec_result[0].get('text'):
+            self.text += rec_result[0]['text']
+        return self.text
@@ -0,0 +1,35 @@
+import time
+
+# 假模型，用来单独测量流式识别管线本身的开销（队列、缓冲、缓存分叉、UDP 发送）
+#
+# generate() 的接口和 funasr.AutoModel 一致，每次调用固定耗时 delay 秒，
+# 再加上 rtf 倍的输入音频时长（模拟推理耗时随输入变长）。
+# 输出是确定的：按缓存里累计的采样数，每 1/chars_per_second 秒音频吐出一个字，
+# 预测分支分叉出去的缓存不影响正式缓存，和流式模型的行为一致（非流式模型不用 cache，预测时传入的是空缓存）。
+# 等待用 sleep，不占 CPU，测得的 CPU 时间只算管线本身
+
+alphabet = '一二三四五六七八九十'
+
+
+class StubModel:
+
+    def __init__(self, delay=0.02, rtf=0.0, chars_per_second=4.0, samplerate=16000):
+        self.delay = delay
+        self.rtf = rtf
+        self.step = samplerate / chars_per_second
+        self.samplerate = samplerate
+
+    def generate(self, input, cache=None, is_final=False, **kwargs):
+        if isinstance(input, list):
+            return [self.generate(data, cache, is_final)[0] for data in input]
+        time.sleep(self.delay + len(input) / self.samplerate * self.rtf)
+        cache = {} if cache is None else cache
+        before = int(cache.get('samples', 0) // self.step)
+        cache['samples'] = cache.get('samples', 0) + len(input)
+        after = int(cache['samples'] // self.step)
+        return [{'text': ''.join(alphabet[i % len(alphabet)] for i in range(before, after))}]
+
+
+def load_model(delay=0.02, rtf=0.0, chars_per_second=4.0):
+    """和 model_loader.load_model 一样返回 (模型, 各阶段耗时)"""
+    return StubModel(delay, rtf, chars_per_second), {'import': 0.0, 'load': 0.0}
@@ -0,0 +1,78 @@
+import os
+import json
+
+# 转写结果的写出
+#
+# 原先每一句都要 makedirs、以追加方式打开 spk{n}.txt、写一条、再关掉。
+# TranscriptWriter 在一个文件的处理过程中一直开着各个输出文件，写入先进缓冲，
+# 每 flush_every 句刷一次盘，close() 时全部写完关闭。同一遍里输出：
+#   - txt：每个说话人一个 spk{n}.txt，格式和原来一样
+#   - srt、vtt：整个文件一份字幕，每句前面带说话人
+#   - json：整个文件一份，所有句子的列表
+# 时间均为毫秒
+
+
+def timestamp(milliseconds, sep='.'):
+    """毫秒转成 HH:MM:SS.mmm，srt 用逗号分隔毫秒"""
+    seconds, ms = divmod(int(milliseconds), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}{sep}{ms:03d}'
+
+
+class TranscriptWriter:
+
+    def __init__(self, directory, name, formats=('txt', 'srt', 'vtt', 'json'),
+                 flush_every=50, buffering=64 * 1024):
+        self.directory = directory
+        self.name = name
+        self.formats = formats
+        self.flush_every = flush_every
+        self.buffering = buffering
+        os.makedirs(directory, exist_ok=True)
+        self.speakers = {}      # 说话人 -> spk{n}.txt
+        self.files = {}         # 格式 -> 整个文件的输出
+        self.sentences = []
+        self.count = 0
+        for fmt in ('srt', 'vtt'):
+            if fmt in formats:
+                self.files[fmt] = self._open(f'{name}.{fmt}')
+        if 'vtt' in self.files:
+            self.files['vtt'].write('WEBVTT\n\n')
+
+    def _open(self, filename):
+        return open(os.path.join(self.directory, filename), 'w', encoding='utf-8', buffering=self.buffering)
+
+    def write(self, spk, start, end, text):
+        self.count += 1
+        if 'txt' in self.formats:
+            if spk not in self.speakers:
+                self.speakers[spk] = self._open(f'spk{spk}.txt')
+            self.speakers[spk].write(f'{timestamp(start)} --> {timestamp(end)}\n{text}\n\n')
+        if 'srt' in self.files:
+            self.files['srt'].write(f'{self.count}\n{timestamp(start, ",")} --> {timestamp(end, ",")}\nspk{spk}: {text}\n\n')
+        if 'vtt' in self.files:
+            self.files['vtt'].write(f'{timestamp(start)} --> {timestamp(end)}\n<v spk{spk}>{text}\n\n')
+        if 'json' in self.formats:
+            self.sentences.append({'spk': spk, 'start': start, 'end': end, 'text': text})
+        if self.count % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        for f in list(self.speakers.values()) + list(self.files.values()):
+            f.flush()
+
+    def close(self):
+        if 'json' in self.formats:
+            with self._open(f'{self.name}.json') as f:
+                json.dump(self.sentences, f, ensure_ascii=False, indent=1)
+        for f in list(self.speakers.values()) + list(self.files.values()):
+            f.close()
+        self.speakers.clear()
+        self.files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
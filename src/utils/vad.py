@@ -0,0 +1,116 @@
+from collections import deque
+
+import numpy as np
+
+# 流式端点检测，放在识别前面，静音时不做推理
+#
+# 原先不管有没有人说话，每凑满一个窗口、每到预测间隔都要跑一次 model.generate，
+# 会议室里大约四成时间是静音。这里逐片段判断语音/静音：
+#   - energy：按片段能量判断，噪声底自适应跟踪，高出噪声底 margin_db 且高于 floor_db 视为语音。
+#     噪声底从 floor_db 起步（不用第一个片段，免得一开口就开始录时把说话声当成噪声底），
+#     遇到更安静的片段立即下调，静音时慢慢跟随；语音中每个片段最多上调 rise_db，
+#     且不超过最近 noise_window 个片段里最低电平 - margin_db + steady_db（最小值统计）：
+#     连续说话时最安静的字也不会被噪声底追上而切断；平稳的背景噪声一个窗口内起伏不到 steady_db，
+#     所以比 floor_db 高的噪声开头一两秒会被当作语音，之后噪声底就跟上了
+#   - fsmn：用 FSMN-VAD 模型流式判断（vad_model_path 里配置的那个模型）
+#   - None：不做端点检测，所有片段都当作语音
+# 状态机带拖尾（hangover）：语音后连续 hangover 个静音片段才判定语音结束，
+# 语音开始时补上前面 pad 个片段，避免吞掉首字。
+#
+# feed() 每次输入一个片段，产出 (片段, 语音结束) 二元组：
+#   静音时什么也不产出；语音开始时先产出缓存的前导片段；
+#   语音结束时最后一个片段带 True，识别端据此把当前这段立即解码出实文字
+# reset() 只结束当前这段（收到 'end' 时调用），噪声底和 FSMN 的状态保留，说到一半按回车，后面的话照常识别
+
+
+class StreamingVAD:
+
+    def __init__(self, mode='energy', model=None, frame=960, samplerate=16000,
+                 hangover=8, pad=5, margin_db=10.0, floor_db=-50.0, smoothing=0.05, rise_db=0.2,
+                 noise_window=50, steady_db=2.0):
+        if mode == 'fsmn' and model is None:
+            raise ValueError('fsmn 模式需要传入 FSMN-VAD 模型')
+        self.mode = mode
+        self.model = model
+        self.frame_ms = frame * 1000 // samplerate
+        self.hangover = hangover
+        self.pad = pad
+        self.margin_db = margin_db
+        self.floor_db = floor_db
+        self.smoothing = smoothing
+        self.rise_db = rise_db
+        self.steady_db = steady_db
+        self.noise_db = floor_db
+        self.levels = deque(maxlen=noise_window)   # 最近各片段的电平，用于最小值统计
+        self.cache = {}
+        self.fsmn_speech = False
+
+        # 前导片段用预分配的小环形缓冲保存，输入的片段可能是共享内存上的视图，必须拷贝
+        self.pre_roll = np.zeros((pad, frame), dtype=np.float32)
+        self.counters = {'frames': 0, 'speech_frames': 0, 'segments': 0}
+        self.reset()
+
+    def reset(self):
+        # 结束当前这段，噪声底、FSMN 缓存保留
+        self.speaking = False
+        self.silent = 0            # 语音中连续静音的片段数
+        self.pre_count = 0         # 前导缓冲里的片段数
+        self.pre_next = 0
+
+    def is_speech(self, samples):
+        if self.mode is None:
+            return True
+        if self.mode == 'fsmn':
+            return self._fsmn(samples)
+        power = float(np.dot(samples, samples)) / len(samples)
+        level = 10 * np.log10(power + 1e-10)
+        self.levels.append(level)
+        speech = level > self.floor_db and level > self.noise_db + self.margin_db
+        # 噪声底：静音时慢慢跟随，语音中缓慢上调（不超过窗口内最低电平决定的上限），遇到更安静的片段立即下调
+        if speech:
+            ceiling = min(self.levels) - self.margin_db + self.steady_db
+            self.noise_db = min(self.noise_db + self.rise_db, ceiling)
+        else:
+            self.noise_db += self.smoothing * (level - self.noise_db)
+        self.noise_db = min(self.noise_db, level)
+        return speech
+
+    def _fsmn(self, samples):
+        # FSMN-VAD 流式输出形如 [[beg, -1]]（语音开始）、[[-1, end]]（语音结束）
+        res = self.model.generate(input=samples, cache=self.cache, is_final=False, chunk_size=self.frame_ms)
+        for beg, end in (res[0].get('value', []) if res else []):
+            if beg != -1: self.fsmn_speech = True
+            if end != -1: self.fsmn_speech = False
+        return self.fsmn_speech
+
+    def feed(self, samples):
+        self.counters['frames'] += 1
+        speech = self.is_speech(samples)
+
+        if not self.speaking:
+            if not speech:
+                if self.pad:
+                    self.pre_roll[self.pre_next] = samples
+                    self.pre_next = (self.pre_next + 1) % self.pad
+                    self.pre_count = min(self.pre_count + 1, self.pad)
+                return
+            # 语音开始：先补上前导片段
+            self.speaking = True
+            self.silent = 0
+            self.counters['segments'] += 1
+            for i in range(self.pad - self.pre_count, self.pad):
+                yield self.pre_roll[(self.pre_next + i) % self.pad], False
+            self.pre_count = 0
+
+        self.counters['speech_frames'] += 1
+        if speech:
+            self.silent = 0
+            yield samples, False
+            return
+
+        self.silent += 1
+        if self.silent >= self.hangover:
+            self.speaking = False
+            yield samples, True
+        else:
+            yield samples, False
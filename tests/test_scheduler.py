@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from utils.scheduler import PreviewScheduler
+
+
+def settle(preview_time, final_time, chunk_size=(10, 20, 10)):
+    scheduler = PreviewScheduler(chunk_size, cadence=5, target_latency=0.5)
+    scheduler.final_time = final_time
+    scheduler.preview_time = preview_time
+    scheduler._update_cadence()
+    return scheduler
+
+
+def test_fast_inference_previews_every_frame():
+    scheduler = settle(preview_time=0.005, final_time=0.01)
+    assert scheduler.cadence == 1
+    assert scheduler.counters['latency_ok']
+
+
+def test_slow_inference_backs_off_and_reports_missed_latency():
+    # 窗口 1.2 秒，预算 0.96 秒，实文字 0.3 秒后只够 2 次 0.3 秒的预测
+    scheduler = settle(preview_time=0.3, final_time=0.3)
+    assert scheduler.cadence == 10
+    assert not scheduler.counters['latency_ok']
+
+
+def test_no_budget_previews_once_per_window():
+    scheduler = settle(preview_time=0.5, final_time=1.0)
+    assert scheduler.cadence == 20
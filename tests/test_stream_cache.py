@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from utils.stream_cache import PreviewDecoder, merge_text
+
+frame = 960
+
+
+class FrameModel:
+    """假的非流式模型：每个片段的采样值是一个字的编码，解码结果末尾加句号（像标点模型）"""
+
+    def __init__(self):
+        self.inputs = []
+
+    def generate(self, input, cache=None, **kwargs):
+        self.inputs.append(len(input))
+        text = ''.join(chr(int(input[i])) for i in range(0, len(input), frame))
+        return [{'text': text + '。'}]
+
+
+def test_merge_text_drops_overlap_and_cut_punctuation():
+    assert merge_text('今天天气。', '天气很好。') == '今天天气很好。'
+    assert merge_text('', '你好') == '你好'
+    assert merge_text('你好', '世界') == '你好世界'
+
+
+def test_offline_preview_decodes_only_new_frames_plus_context():
+    model = FrameModel()
+    preview = PreviewDecoder(model, context=3 * frame)
+    text = '今天的会议我们讨论一下下个季度的计划安排'
+    window = np.repeat(np.array([ord(c) for c in text], dtype=np.float32), frame)
+    for end in range(5, len(text) + 1, 5):
+        result = preview.decode(window[:end * frame], cache={})
+    assert result == text + '。'
+    # 第一次解码 5 个片段，之后每次 5 个新片段加 3 个左语境，和窗口长度无关
+    assert model.inputs == [5 * frame] + [8 * frame] * 3
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from utils.vad import StreamingVAD
+
+frame = 960
+rng = np.random.default_rng(0)
+
+
+def noise(frames, amplitude):
+    return [(rng.standard_normal(frame) * amplitude).astype(np.float32) for _ in range(frames)]
+
+
+def run(vad, frames):
+    """返回每个片段产出的片段数"""
+    return [len(list(vad.feed(samples))) for samples in frames]
+
+
+def test_stream_starting_in_speech_keeps_first_utterance():
+    vad = StreamingVAD()
+    frames = []
+    for _ in range(5):
+        frames += noise(20, 0.1) + noise(20, 1e-4)
+    out = run(vad, frames)
+    assert vad.counters['segments'] == 5
+    assert sum(out[:20]) == 20
+
+
+def test_end_keeps_noise_floor():
+    vad = StreamingVAD()
+    frames = noise(20, 1e-4) + noise(68, 0.1)
+    out = run(vad, frames[:40])
+    vad.reset()   # 说到一半收到 'end'
+    out += run(vad, frames[40:])
+    assert all(n > 0 for n in out[40:])
+    assert vad.counters['segments'] == 2
+
+
+def test_steady_background_noise_is_learned():
+    vad = StreamingVAD()
+    out = run(vad, noise(150, 0.02))   # 约 -34 dB，高于 floor_db
+    assert sum(out[-50:]) == 0
+
+
+def test_long_continuous_speech_stays_one_segment():
+    vad = StreamingVAD()
+    room = noise(20, 10 ** (-60 / 20))
+    # 30 秒不停顿的说话，每个片段电平在 -38..-18 dB 之间
+    levels = rng.uniform(-38, -18, 500)
+    speech = [frame * 10 ** (db / 20) for frame, db in zip(noise(500, 1.0), levels)]
+    out = run(vad, room + speech)
+    assert vad.counters['segments'] == 1
+    assert all(n > 0 for n in out[20:])
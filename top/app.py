@@ -1,14 +1,18 @@
 import os
+import sys
 import threading
 import tkinter as tk
 import queue
 from datetime import timedelta, datetime
-from pydub import AudioSegment
-import ffmpeg
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog, messagebox
 from funasr import AutoModel
 
-spk_txt_queue = queue.Queue()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from utils import decoder, clips
+from utils.pipeline import Pipeline
+from utils.transcript import TranscriptWriter
+from utils.result_cache import ResultCache
 
 # 创建窗口
 root = tk.Tk()
@@ -71,10 +75,19 @@ model = AutoModel(model=asr_model_path,
                   disable_update=True
                   )
 
+# 识别结果缓存：同一个文件、同样的模型和参数再次处理时直接用缓存，不再识别
+generate_kwargs = dict(batch_size_s=300, is_final=True, sentence_timestamp=True)
+cache_dir = 'cache/asr'
+cache_max_mb = 512
+result_cache = ResultCache(cache_dir, max_bytes=cache_max_mb * 1024 * 1024)
+cache_params = dict(asr_model=asr_model_path, asr_model_revision=asr_model_revision,
+                    vad_model=vad_model_path, vad_model_revision=vad_model_revision,
+                    punc_model=punc_model_path, punc_model_revision=punc_model_revision,
+                    spk_model=spk_model_path, spk_model_revision=spk_model_revision,
+                    **generate_kwargs)
+
 # 创建一个队列，用于线程间通信
 result_queue = queue.Queue()
-# 音频合并队列
-audio_concat_queue = queue.Queue()
 
 # 支持的音视频格式
 support_audio_format = ['.mp3', '.m4a', '.aac', '.ogg', '.wav', '.flac', '.wma', '.aif']
@@ -146,100 +159,153 @@ def to_milliseconds(time_str):
     milliseconds = int(time_delta.total_seconds() * 1000)
     return milliseconds
 
-# 转写获取时间戳，根据时间戳进行切分，然后根据 spk id 进行分类
-# audio: 音频
-# return 切分后按照 spk id 的地址
+# 每个文件依次经过 解码 -> 识别 -> 切分 -> 合并 四个阶段，各阶段同时运行（utils/pipeline.py），
+# 识别阶段只有一个线程，独占模型；其余阶段的并发数在这里配置
+stage_workers = {'decode': 2, 'asr': 1, 'export': 2, 'concat': 1}
+# 阶段之间最多排队的文件数，限制在途的解码数据
+stage_queue_size = 2
+stage_names = {'decode': '解码', 'asr': '识别', 'export': '切分', 'concat': '合并'}
+
+
+# 解码
+# audio: 音视频路径
+def decode_stage(audio):
+    if not os.path.exists(audio):
+        print(f"输入的文件不存在：{audio}")
+        return None
+    audio_name = os.path.splitext(os.path.basename(audio))[0]
+    # ffmpeg 解码成 16000 采样率单声道，从管道直接读成 float32
+    speech = decoder.decode(audio)
+    return {'audio': audio, 'audio_name': audio_name, 'speech': speech}
+
+
+# 转写获取时间戳，按说话人和分离字数合并句子
+def asr_stage(job):
+    cache_key = result_cache.key(job['speech'], **cache_params)
+    rec_result = result_cache.get(cache_key)
+    if rec_result is None:
+        res = model.generate(input=job['speech'], **generate_kwargs)
+        rec_result = res[0]
+        # 缓存写不进去（无法序列化、磁盘满）不影响这次的结果
+        try:
+            result_cache.put(cache_key, rec_result)
+        except Exception as e:
+            print(f"{job['audio']} 识别结果写入缓存失败：{e}")
+    else:
+        print(f"{job['audio']} 使用缓存的识别结果")
+    asr_result_text = rec_result['text']
+    if asr_result_text == '':
+        print(f"{job['audio']} 没有转写结果")
+        return None
+    sentences = []
+    for sentence in rec_result["sentence_info"]:
+        start = to_date(sentence["start"])
+        end = to_date(sentence["end"])
+        if sentences and sentence["spk"] == sentences[-1]["spk"] and len(sentences[-1]["text"]) < int(split_number.get()):
+            sentences[-1]["text"] += "" + sentence["text"]
+            sentences[-1]["end"] = end
+        else:
+            sentences.append(
+                {"text": sentence["text"], "start": start, "end": end, "spk": sentence["spk"]}
+            )
+    job['text'] = asr_result_text
+    job['sentences'] = sentences
+    return job
+
+
+# 根据时间戳进行切分，然后根据 spk id 进行分类
+def export_stage(job):
+    audio = job['audio']
+    audio_name = job['audio_name']
+    speaker_audios = {}  # 每个说话人作为 key，value 为列表，列表中为当前说话人对应的每个音频片段
+    # 剪切音频或视频片段：先收集所有片段，再一次性切出
+    file_ext = os.path.splitext(audio)[-1]
+    date = datetime.now().strftime("%Y-%m-%d")
+    clip_list = []
+    i = 0
+    # 每个说话人的 txt，以及整个文件的 srt、vtt、json，处理完这个文件后关闭
+    spk_txt_path = os.path.join(save_path.get(), date, audio_name)
+    with TranscriptWriter(spk_txt_path, audio_name) as writer:
+        for stn in job['sentences']:
+            stn_txt = stn['text']
+            start = to_milliseconds(stn['start'])
+            end = to_milliseconds(stn['end'])
+            spk = stn['spk']
+
+            # 根据文件名和 spk 创建目录
+            final_save_path = os.path.join(save_path.get(), date, audio_name, str(spk))
+            os.makedirs(final_save_path, exist_ok=True)
+            # 音频片段从解码好的 PCM 切出，存为 wav；视频片段存为 mp4
+            clip_ext = '.mp4' if file_ext in support_video_format else '.wav'
+            final_save_file = os.path.join(final_save_path, str(i)+clip_ext)
+            writer.write(spk, start, end, stn_txt)
+            i += 1
+            clip_list.append((start, end, final_save_file))
+            # 记录说话人和对应的音频片段，用于合并音频片段
+            if spk not in speaker_audios:
+                speaker_audios[spk] = []  # 列表中存储音频片段
+            speaker_audios[spk].append({'file': final_save_file, 'audio_name': audio_name,
+                                        'start': start, 'end': end})
+    try:
+        if file_ext in support_audio_format:
+            clips.cut_audio(job['speech'], clip_list)
+        elif file_ext in support_video_format:
+            clips.cut_video(audio, clip_list, hwaccel='cuda')
+        else:
+            print(f'{audio}不支持')
+    except Exception as e:
+        print(f"剪切音频发生错误，错误信息：{e}")
+    ret = {"text": job['text'], "sentences": job['sentences']}
+    print(f'{audio} 切分完成')
+    print(f'转写结果：{ret}')
+    job['speakers'] = speaker_audios
+    return job
+
+
+# 同时编码 mp3 的说话人数，编码在 ffmpeg 子进程里进行，线程池就够了
+concat_workers = 4
+concat_pool = ThreadPoolExecutor(max_workers=concat_workers)
+
+
+def concat_speaker(speech, spk, audio_segments):
+    # 从解码好的整段 PCM 里取出该说话人的所有片段拼接，不再读回切好的片段
+    audio_name = audio_segments[0]['audio_name']
+    output_file = os.path.join(save_path.get(), datetime.now().strftime("%Y-%m-%d"), audio_name, f"{spk}.mp3")
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    track = clips.gather(speech, [(seg['start'], seg['end']) for seg in audio_segments])
+    clips.export_mp3(track, output_file)
+    print(f"已将 {spk} 的音频合并到 {output_file}")
+
+
+# 合并每个说话人的音频片段，各说话人并行编码
+def concat_stage(job):
+    futures = [concat_pool.submit(concat_speaker, job['speech'], spk, audio_segments)
+               for spk, audio_segments in job['speakers'].items()]
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            print(f"合并音频发生错误，错误信息：{e}")
+    return job['audio']
+
+
 def trans():
     if len(selected_file_list) != 0 and save_path.get() != '' and save_path.get() is not None:
-        for audio in selected_file_list:
-            if os.path.exists(audio):
-                audio_name = os.path.splitext(os.path.basename(audio))[0]
-                _, audio_extension = os.path.splitext(audio)
-                show_info_label.config(text=f'正在执行中，请勿关闭程序。{audio}')
-                speaker_audios = {}  # 每个说话人作为 key，value 为列表，列表中为当前说话人对应的每个音频片段
-                # 音频预处理
-                try:
-                    audio_bytes, _ = (
-                        ffmpeg.input(audio, threads=0, hwaccel='cuda')
-                        .output("-", format="wav", acodec="pcm_s16le", ac=1, ar=16000)
-                        .run(cmd=["ffmpeg", "-nostdin"], capture_stdout=True, capture_stderr=True)
-                    )
-                    res = model.generate(input=audio_bytes, batch_size_s=300, is_final=True, sentence_timestamp=True)
-                    rec_result = res[0]
-                    asr_result_text = rec_result['text']
-                    if asr_result_text != '':
-                        sentences = []
-                        for sentence in rec_result["sentence_info"]:
-                            start = to_date(sentence["start"])
-                            end = to_date(sentence["end"])
-                            if sentences and sentence["spk"] == sentences[-1]["spk"] and len(sentences[-1]["text"]) < int(split_number.get()):
-                                sentences[-1]["text"] += "" + sentence["text"]
-                                sentences[-1]["end"] = end
-                            else:
-                                sentences.append(
-                                    {"text": sentence["text"], "start": start, "end": end, "spk": sentence["spk"]}
-                                )
-
-                        # 剪切音频或视频片段
-                        i = 0
-                        for stn in sentences:
-                            stn_txt = stn['text']
-                            start = stn['start']
-                            end = stn['end']
-                            # tmp_start = to_milliseconds(start)
-                            # tmp_end = to_milliseconds(end)
-                            # duration = round((tmp_end - tmp_start) / 1000, 3)
-                            spk = stn['spk']
-
-                            # 根据文件名和 spk 创建目录
-                            date = datetime.now().strftime("%Y-%m-%d")
-                            final_save_path = os.path.join(save_path.get(), date, audio_name, str(spk))
-                            os.makedirs(final_save_path, exist_ok=True)
-                            # 获取音视频后缀
-                            file_ext = os.path.splitext(audio)[-1]
-                            final_save_file = os.path.join(final_save_path, str(i)+file_ext)
-                            spk_txt_path = os.path.join(save_path.get(), date, audio_name)
-                            spk_txt_file = os.path.join(spk_txt_path, f'spk{spk}.txt')
-                            spk_txt_queue.put({'spk_txt_file': spk_txt_file, 'spk_txt': stn_txt, 'start': start, 'end': end})
-                            i += 1
-                            try:
-                                if file_ext in support_audio_format:
-                                    (
-                                        ffmpeg.input(audio, threads=0, ss=start, to=end, hwaccel='cuda')
-                                        .output(final_save_file)
-                                        .run(cmd=["ffmpeg", "-nostdin"], overwrite_output=True, capture_stdout=True,
-                                             capture_stderr=True)
-                                    )
-                                elif file_ext in support_video_format:
-                                    final_save_file = os.path.join(final_save_path, str(i)+'.mp4')
-                                    (
-                                        ffmpeg.input(audio, threads=0, ss=start, to=end, hwaccel='cuda')
-                                        .output(final_save_file, vcodec='libx264', crf=23, acodec='aac', ab='128k')
-                                        .run(cmd=["ffmpeg", "-nostdin"], overwrite_output=True, capture_stdout=True,
-                                             capture_stderr=True)
-                                    )
-                                else:
-                                    print(f'{audio}不支持')
-                            except ffmpeg.Error as e:
-                                print(f"剪切音频发生错误，错误信息：{e}")
-                            # 记录说话人和对应的音频片段，用于合并音频片段
-                            if spk not in speaker_audios:
-                                speaker_audios[spk] = []  # 列表中存储音频片段
-                            speaker_audios[spk].append({'file': final_save_file, 'audio_name': audio_name})
-                        ret = {"text": asr_result_text, "sentences": sentences}
-                        print(f'{audio} 切分完成')
-                        result_queue.put(f'{audio} 切分完成')
-                        show_info_label.config(text=f'{audio} 切分完成')
-                        print(f'转写结果：{ret}')
-                        # 存入合并队列
-                        audio_concat_queue.put(speaker_audios)
-                    else:
-                        print("没有转写结果")
-                except Exception as e:
-                    print(f"转写异常：{e}")
-            else:
-                print("输入的文件不存在")
-                messagebox.showinfo("提醒", "输入的文件不存在")
+        files = list(selected_file_list)
+        show_info_label.config(text=f'正在执行中，请勿关闭程序。共 {len(files)} 个文件')
+
+        # 每个文件每个阶段的进度都发到 result_queue，由 show_info 显示
+        def on_event(index, stage, status, info):
+            result_queue.put({'file': files[index], 'index': index, 'total': len(files),
+                              'stage': stage, 'status': status, 'info': info})
+
+        pipeline = Pipeline([('decode', decode_stage, stage_workers['decode']),
+                             ('asr', asr_stage, stage_workers['asr']),
+                             ('export', export_stage, stage_workers['export']),
+                             ('concat', concat_stage, stage_workers['concat'])],
+                            maxsize=stage_queue_size, on_event=on_event)
+        done = pipeline.run(files)
+        result_queue.put(f'全部完成，成功 {len(done)} 个，共 {len(files)} 个')
     else:
         print("没有填写输入输出")
         messagebox.showinfo("提醒", "没有填写选择文件或保存路径")
@@ -260,50 +326,31 @@ show_info_label.pack(side=tk.LEFT, padx=10, pady=2)
 
 
 def show_info():
-    res = result_queue.get()
-    show_info_label.config(text=res)
-
-
-threading.Thread(target=show_info).start()
-
-
-def write_txt():
     while True:
-        item = spk_txt_queue.get()
-        spk_txt_file = item['spk_txt_file']
-        spk_txt = item['spk_txt']
-        spk_start = item['start']
-        spk_end = item['end']
-        dir_path = os.path.dirname(spk_txt_file)
-        os.makedirs(dir_path, exist_ok=True)
-        with open(spk_txt_file, 'a', encoding='utf-8') as f:
-            f.write(f"{spk_start} --> {spk_end}\n{spk_txt}\n\n")
-
-
-threading.Thread(target=write_txt).start()
+        res = result_queue.get()
+        if isinstance(res, dict):
+            # 流水线的进度事件
+            name = os.path.basename(res['file'])
+            stage = stage_names[res['stage']]
+            if res['status'] == 'error':
+                print(f"{res['file']} {stage}异常：{res['info']}")
+                res = f"{name} {stage}异常：{res['info']}"
+            elif res['status'] == 'start':
+                res = f"[{res['index'] + 1}/{res['total']}] {name} 正在{stage}"
+            elif res['status'] == 'done' and res['stage'] == 'concat':
+                res = f"[{res['index'] + 1}/{res['total']}] {name} 切分完成"
+            elif res['status'] == 'skip' and res['stage'] == 'decode':
+                res = f"[{res['index'] + 1}/{res['total']}] {name} 输入的文件不存在"
+                # 交给主线程弹窗，不阻塞后面的进度显示
+                root.after(0, messagebox.showinfo, "提醒", f"输入的文件不存在：{name}")
+            elif res['status'] == 'skip':
+                res = f"[{res['index'] + 1}/{res['total']}] {name} 没有转写结果"
+            else:
+                continue
+        show_info_label.config(text=res)
 
 
-def audio_concat_worker():
-    while True:
-        speaker_audios_tmp = audio_concat_queue.get()
-        for spk, audio_segments in speaker_audios_tmp.items():
-            # 合并每个说话人的音频片段
-            audio_name = audio_segments[0]['audio_name']
-            output_file = os.path.join(save_path.get(), datetime.now().strftime("%Y-%m-%d"), audio_name, f"{spk}.mp3")
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            inputs = [seg['file'] for seg in audio_segments]
-            concat_audio = AudioSegment.from_file(inputs[0])
-            for i in range(1, len(inputs)):
-                concat_audio = concat_audio + AudioSegment.from_file(inputs[i])
-            concat_audio.export(output_file, format="mp3")
-            print(f"已将 {spk} 的音频合并到 {output_file}")
-        audio_concat_queue.task_done()
-
-
-# 创建一个线程用于消费音频合并队列中的内容
-audio_concat_thread = threading.Thread(target=audio_concat_worker)
-audio_concat_thread.daemon = True
-audio_concat_thread.start()
+threading.Thread(target=show_info, daemon=True).start()
 
 
 if __name__ in '__main__':